@@ -1,11 +1,64 @@
 # booking/admin.py
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Prefetch, Value
+from django.db.models.functions import Concat
+from django.utils.functional import cached_property
 from .models import Profile, Car, Booking, FuelRefill
 
+# ทะเบียนรถ (หมวด + เลข) คำนวณใน SQL เพื่อให้ sort ใน changelist ได้
+_PLATE = Concat("car__plate_prefix", Value(" "), "car__plate_number")
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator ที่ใช้จำนวนแถวโดยประมาณจาก pg_class.reltuples เมื่อไม่มีการกรอง
+    (ไม่ต้อง COUNT(*) ทั้งตาราง) ถ้ามี filter/search หรือไม่ใช่ PostgreSQL
+    หรือตารางยังเล็ก จะกลับไปนับจริงตามปกติ
+    """
+
+    # ต่ำกว่านี้นับจริงไปเลย (เร็วอยู่แล้ว และตัวเลขตรง)
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        estimate = self._estimated_count()
+        if estimate is not None and estimate >= self.exact_below:
+            return estimate
+        return super().count
+
+    def _estimated_count(self):
+        qs = self.object_list
+        query = getattr(qs, "query", None)
+        if query is None or query.where or query.distinct:
+            return None
+        connection = connections[qs.db]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE relname = %s",
+                [qs.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        # reltuples = -1 แปลว่ายังไม่เคย ANALYZE
+        if not row or row[0] is None or row[0] < 0:
+            return None
+        return int(row[0])
+
+
+class FastAdmin(admin.ModelAdmin):
+    """ไม่นับ "X of Y total" และใช้จำนวนแถวโดยประมาณเมื่อไม่ได้กรอง"""
+
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
 
 @admin.register(Profile)
-class ProfileAdmin(admin.ModelAdmin):
+class ProfileAdmin(FastAdmin):
     list_display = ("user", "department", "position", "role")
+    list_select_related = ("user",)
     list_filter = ("role", "department")
     search_fields = (
         "user__username",
@@ -17,7 +70,7 @@ class ProfileAdmin(admin.ModelAdmin):
 
 
 @admin.register(Car)
-class CarAdmin(admin.ModelAdmin):
+class CarAdmin(FastAdmin):
     list_display = (
         "display_plate",
         "brand_name",
@@ -38,24 +91,45 @@ class CarAdmin(admin.ModelAdmin):
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
-    list_display = ("car", "requester", "start_date", "end_date", "status")
-    list_filter = ("status", "car", "start_date", "end_date")
+class BookingAdmin(FastAdmin):
+    list_display = ("plate", "requester", "start_date", "end_date", "status")
+    list_select_related = ("car", "requester")
+    list_filter = ("status",)
+    autocomplete_fields = ("car", "requester")
     search_fields = (
-        "car__plate_prefix",
         "car__plate_number",
         "requester__username",
-        "requester__first_name",
-        "requester__last_name",
         "destination",
     )
 
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("car", "requester", "returned_by")
+            .prefetch_related(
+                Prefetch(
+                    "co_travelers", queryset=Profile.objects.select_related("user")
+                )
+            )
+            .annotate(plate=_PLATE)
+        )
+
+    @admin.display(description="ทะเบียนรถ", ordering="plate")
+    def plate(self, obj):
+        return obj.plate
+
 
 @admin.register(FuelRefill)
-class FuelRefillAdmin(admin.ModelAdmin):
-    list_display = ("car", "refill_date", "liters", "total_price", "odometer")
+class FuelRefillAdmin(FastAdmin):
+    list_display = ("plate", "refill_date", "liters", "total_price", "odometer")
+    list_select_related = ("car",)
     list_filter = ("refill_date", "car")
-    search_fields = (
-        "car__plate_prefix",
-        "car__plate_number",
-    )
+    search_fields = ("car__plate_number",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(plate=_PLATE)
+
+    @admin.display(description="ทะเบียนรถ", ordering="plate")
+    def plate(self, obj):
+        return obj.plate
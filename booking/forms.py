@@ -1,8 +1,10 @@
 # booking/forms.py
 from django import forms
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
-from .models import Profile, Car
+from .models import Profile, Car, FuelRefill
 
 
 # ---------- ตัวเลือกกอง/แผนก/ตำแหน่ง (ปรับได้ตามจริงภายหลัง) ----------
@@ -79,21 +81,27 @@ class CarForm(forms.ModelForm):
         }
 
 
-from .models import FuelRefill
-
-
 class FuelRefillForm(forms.ModelForm):
     class Meta:
         model = FuelRefill
         fields = [
             "refill_date",
             "fuel_place",
-            "yp_number",
-            "odometer",
             "price_per_liter",
             "liters",
             "total_price",
+            "odometer",
+            "yp_number",
         ]
+        labels = {
+            "refill_date": "วันที่เติมน้ำมัน",
+            "fuel_place": "สถานที่เติมน้ำมัน",
+            "price_per_liter": "ราคาน้ำมันต่อลิตร",
+            "liters": "จำนวนลิตร",
+            "total_price": "รวมราคา",
+            "odometer": "เลขไมล์",
+            "yp_number": "เลข ยพ.",
+        }
         widgets = {
             "refill_date": forms.DateInput(attrs={"type": "date"}),
         }
@@ -104,24 +112,103 @@ class FuelRefillForm(forms.ModelForm):
             f.widget.attrs.update({"class": "form-control"})
 
 
-class FuelRefillForm(forms.ModelForm):
+def _decimal_error_messages(label: str) -> dict:
+    """ข้อความ error ภาษาไทยเมื่อเกิน max_digits / decimal_places ของ DecimalField"""
+    return {
+        "max_digits": f"{label}ต้องมีตัวเลขรวมไม่เกิน %(max)s หลัก",
+        "max_decimal_places": f"{label}มีทศนิยมได้ไม่เกิน %(max)s ตำแหน่ง",
+        "max_whole_digits": f"{label}ต้องมีไม่เกิน %(max)s หลักก่อนจุดทศนิยม",
+    }
+
+
+class UserFuelRefillForm(forms.ModelForm):
+    """
+    ฟอร์มบันทึกเติมน้ำมันหน้า user_fuel_refill (ชื่อ field ตรงกับ input ใน template)
+    ไม่ได้ใช้ render ฟอร์ม ใช้ตรวจ/แปลงค่าจาก POST อย่างเดียว
+    ไม่กรอกวันที่ (หรือรูปแบบผิด) -> ใช้วันนี้
+    ส่ง booking มาด้วยได้ ถ้า car_id ตรงกับรถของ booking จะใช้ booking.car เลย ไม่ query ซ้ำ
+    """
+
+    car_id = forms.IntegerField(
+        error_messages={
+            "required": "กรุณาเลือกทะเบียนรถ",
+            "invalid": "กรุณาเลือกทะเบียนรถ",
+        },
+    )
+    # รับเป็นข้อความแล้ว parse เอง: ว่าง/รูปแบบผิด -> ใช้วันนี้ (เหมือนหน้าเดิม ไม่แจ้ง error)
+    refill_date = forms.CharField(required=False)
+
+    # ลำดับการตรวจ = ลำดับข้อความ error ที่ผู้ใช้เห็นก่อน
+    field_order = [
+        "car_id",
+        "fuel_place",
+        "yp_number",
+        "odometer",
+        "price_per_liter",
+        "liters",
+        "total_price",
+        "refill_date",
+    ]
+
     class Meta:
         model = FuelRefill
         fields = [
             "refill_date",
             "fuel_place",
+            "yp_number",
+            "odometer",
             "price_per_liter",
             "liters",
             "total_price",
-            "odometer",
-            "yp_number",
         ]
-        labels = {
-            "refill_date": "วันที่เติมน้ำมัน",
-            "fuel_place": "สถานที่เติมน้ำมัน",
-            "price_per_liter": "ราคาน้ำมันต่อลิตร",
-            "liters": "จำนวนลิตร",
-            "total_price": "รวมราคา",
-            "odometer": "เลขไมล์",
-            "yp_number": "เลข ยพ.",
+        error_messages = {
+            "fuel_place": {"required": "กรุณากรอกสถานที่เติมน้ำมัน 697"},
+            "yp_number": {"required": "กรุณากรอกเลข ยพ."},
+            "odometer": {
+                "required": "กรุณากรอกเลขไมล์",
+                "invalid": "เลขไมล์ต้องเป็นตัวเลข 711",
+            },
+            "price_per_liter": {
+                "required": "กรุณากรอกราคาน้ำมันต่อลิตรให้ถูกต้อง",
+                "invalid": "กรุณากรอกราคาน้ำมันต่อลิตรให้ถูกต้อง",
+                **_decimal_error_messages("ราคาน้ำมันต่อลิตร"),
+            },
+            "liters": {
+                "required": "กรุณากรอกจำนวนลิตรให้ถูกต้อง",
+                "invalid": "กรุณากรอกจำนวนลิตรให้ถูกต้อง",
+                **_decimal_error_messages("จำนวนลิตร"),
+            },
+            "total_price": {
+                "required": "กรุณากรอกราคารวมให้ถูกต้อง",
+                "invalid": "กรุณากรอกราคารวมให้ถูกต้อง",
+                **_decimal_error_messages("ราคารวม"),
+            },
         }
+
+    def __init__(self, *args, booking=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.booking = booking
+        # ใน model เว้นว่างได้ แต่หน้า user บังคับกรอก
+        for name in ("fuel_place", "yp_number", "price_per_liter"):
+            self.fields[name].required = True
+
+    def clean_car_id(self):
+        car_id = self.cleaned_data["car_id"]
+        # เคสปกติ: มาจากหน้าคืนรถ รถคือคันของ booking ที่โหลดมาแล้ว
+        if self.booking is not None and self.booking.car_id == car_id:
+            return self.booking.car
+        car = Car.objects.only("id").filter(id=car_id).first()
+        if car is None:
+            raise forms.ValidationError("กรุณาเลือกทะเบียนรถ")
+        return car
+
+    def clean_refill_date(self):
+        try:
+            refill_date = parse_date(self.cleaned_data.get("refill_date") or "")
+        except ValueError:  # รูปแบบถูกแต่ไม่มีวันนั้นจริง เช่น 2025-02-30
+            refill_date = None
+        return refill_date or timezone.localdate()
+
+    def first_error(self) -> str:
+        """ข้อความ error แรกตามลำดับ field (หน้าเดิมแจ้งทีละข้อ)"""
+        return next(iter(self.errors.values()))[0]
@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.db import transaction
 from booking.models import Profile, Car
 
 
@@ -217,84 +219,89 @@ class Command(BaseCommand):
         "Seed initial data: admin users, employee users, and cars for กดส. เขต 1 อุดรธานี"
     )
 
+    @transaction.atomic
     def handle(self, *args, **options):
         self.stdout.write(self.style.MIGRATE_HEADING("Seeding initial data..."))
 
-        # สร้างธุรการ
-        for admin in ADMIN_USERS:
-            user, created = User.objects.get_or_create(
-                username=admin["username"],
-                defaults={
-                    "first_name": admin["first_name"],
-                    "last_name": admin["last_name"],
-                    "is_staff": True,
-                },
+        # (ข้อมูล, role) ของผู้ใช้ทั้งหมด: ธุรการ + พนักงานทั่วไป
+        people = [(d, "ADM") for d in ADMIN_USERS] + [(d, "EMP") for d in EMP_USERS]
+        usernames = [d["username"] for d, _ in people]
+
+        # ดึง username ที่มีอยู่แล้วทีเดียว แล้วสร้างเฉพาะที่ขาด
+        existing = set(
+            User.objects.filter(username__in=usernames).values_list(
+                "username", flat=True
             )
-            if created:
-                user.set_password(PASSWORD)
-                user.save()
+        )
+
+        # ทุกคนใช้รหัสผ่านเดียวกัน -> hash ครั้งเดียว (PBKDF2 ช้า)
+        password_hash = make_password(PASSWORD)
+
+        new_users = []
+        for d, role in people:
+            label = "admin" if role == "ADM" else "employee"
+            if d["username"] in existing:
                 self.stdout.write(
-                    self.style.SUCCESS(f"Created admin user: {user.username}")
+                    f"{label.capitalize()} user already exists: {d['username']}"
                 )
-            else:
-                self.stdout.write(f"Admin user already exists: {user.username}")
+                continue
 
-            profile, _ = Profile.objects.get_or_create(
-                user=user,
-                defaults={
-                    "department": DEPARTMENT,
-                    "section": "กอง กดส.",
-                    "position": admin["position"],
-                    "role": "ADM",
-                },
+            user = User(
+                username=d["username"],
+                first_name=d["first_name"],
+                last_name=d["last_name"],
+                is_staff=(role == "ADM"),
+                password=password_hash,
             )
-
-        # สร้างพนักงานทั่วไป
-        for emp in EMP_USERS:
-            user, created = User.objects.get_or_create(
-                username=emp["username"],
-                defaults={
-                    "first_name": emp["first_name"],
-                    "last_name": emp["last_name"],
-                    "is_staff": False,
-                },
+            new_users.append(user)
+            self.stdout.write(
+                self.style.SUCCESS(f"Created {label} user: {user.username}")
             )
-            if created:
-                user.set_password(PASSWORD)
-                user.save()
-                self.stdout.write(
-                    self.style.SUCCESS(f"Created employee user: {user.username}")
+
+        User.objects.bulk_create(new_users, batch_size=500)
+
+        # สร้าง Profile ให้ทุก user ที่ยังไม่มี (user_id เป็น unique -> ข้ามตัวที่มีแล้ว)
+        users_by_name = User.objects.in_bulk(usernames, field_name="username")
+        Profile.objects.bulk_create(
+            [
+                Profile(
+                    user=users_by_name[d["username"]],
+                    division="กอง กดส.",
+                    department=DEPARTMENT,
+                    position=d["position"],
+                    role=role,
                 )
-            else:
-                self.stdout.write(f"Employee user already exists: {user.username}")
+                for d, role in people
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
 
-            profile, _ = Profile.objects.get_or_create(
-                user=user,
-                defaults={
-                    "department": DEPARTMENT,
-                    "section": "กอง กดส.",
-                    "position": emp["position"],
-                    "role": "EMP",
-                },
-            )
+        # สร้างรถ: plate_number ในข้อมูลเป็นแบบ "งค 3814 ขก" -> แยกหมวด/เลขทะเบียน
+        existing_plates = set(Car.objects.values_list("plate_prefix", "plate_number"))
 
-        # สร้างรถ
+        new_cars = []
         for car_data in CARS:
-            car, created = Car.objects.get_or_create(
-                plate_number=car_data["plate_number"],
-                defaults={
-                    "province_full": car_data["province_full"],
-                    "car_type": car_data["car_type"],
-                    "brand_model": car_data["brand_model"],
-                    "color_code": car_data["color_code"],
-                    "is_active": True,
-                },
-            )
-            if created:
-                self.stdout.write(
-                    self.style.SUCCESS(f"Created car: {car.plate_number}")
+            prefix, number = car_data["plate_number"].split()[:2]
+            plate = f"{prefix} {number}"
+            if (prefix, number) in existing_plates:
+                self.stdout.write(f"Car already exists: {plate}")
+                continue
+
+            brand, _, model = car_data["brand_model"].partition(" ")
+            new_cars.append(
+                Car(
+                    plate_prefix=prefix,
+                    plate_number=number,
+                    province_full=car_data["province_full"],
+                    brand_name=brand,
+                    model_name=model,
+                    color_code=car_data["color_code"],
+                    status="READY",
                 )
-            else:
-                self.stdout.write(f"Car already exists: {car.plate_number}")
+            )
+            self.stdout.write(self.style.SUCCESS(f"Created car: {plate}"))
+
+        Car.objects.bulk_create(new_cars, batch_size=500)
 
         self.stdout.write(self.style.SUCCESS("Seeding completed."))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-15 00:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0014_profile_work_status_alter_booking_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='car',
+            name='status',
+            field=models.CharField(choices=[('READY', 'พร้อมใช้งาน'), ('MAINTENANCE', 'ส่งซ่อม'), ('OUT_OF_SERVICE', 'งดใช้งาน'), ('RETIRED', 'ยกเลิกใช้งาน')], db_index=True, default='READY', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['car', 'start_date'], name='booking_boo_car_id_b4f271_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['start_date', 'end_date'], name='booking_boo_start_d_97bc99_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fuelrefill',
+            index=models.Index(fields=['car', 'refill_date'], name='booking_fue_car_id_ccb870_idx'),
+        ),
+    ]
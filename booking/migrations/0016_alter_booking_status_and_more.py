@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-15 00:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0015_alter_car_status_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='car',
+            name='usage_type',
+            field=models.CharField(choices=[('POOL', 'รถเช่ากฟฉ.1'), ('OFFICE', 'รถประจำกอง/ฝ่าย'), ('INSPECT', 'รถตรวจการ/ออกตรวจพื้นที่'), ('OTHER', 'อื่น ๆ')], db_index=True, default='POOL', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='fuelrefill',
+            name='refill_date',
+            field=models.DateField(db_index=True),
+        ),
+    ]
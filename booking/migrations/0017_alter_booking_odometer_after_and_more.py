@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-15 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0016_alter_booking_status_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='odometer_after',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='เลขไมล์หลังใช้งาน'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='odometer_before',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='เลขไมล์ก่อนใช้งาน'),
+        ),
+        migrations.AlterField(
+            model_name='car',
+            name='current_odometer',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='fuelrefill',
+            name='odometer',
+            field=models.PositiveIntegerField(help_text='เลขไมล์ ณ ตอนเติม'),
+        ),
+        migrations.AddIndex(
+            model_name='fuelrefill',
+            index=models.Index(fields=['car', 'odometer'], name='booking_fue_car_id_6117d4_idx'),
+        ),
+    ]
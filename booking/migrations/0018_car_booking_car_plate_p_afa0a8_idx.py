@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-15 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0017_alter_booking_odometer_after_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['plate_prefix', 'plate_number'], name='booking_car_plate_p_afa0a8_idx'),
+        ),
+    ]
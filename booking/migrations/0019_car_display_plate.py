@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-15 00:41
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0018_car_booking_car_plate_p_afa0a8_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='display_plate',
+            field=models.GeneratedField(db_index=True, db_persist=True, expression=django.db.models.functions.text.Concat('plate_prefix', models.Value(' '), 'plate_number', models.Value(' '), 'province_full'), output_field=models.CharField(max_length=128)),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-15 01:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0019_car_display_plate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['car', 'status', 'start_date'], name='booking_overlap_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-15 01:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0020_booking_overlap_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['requester', '-start_date', '-created_at'], name='booking_active_user_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-15 01:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0021_booking_active_user_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'end_date'], name='booking_boo_status_a79bae_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['car', 'end_date'], name='booking_boo_car_id_f3a9b8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'updated_at'], name='booking_boo_status_32b4bc_idx'),
+        ),
+    ]
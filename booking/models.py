@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat
 from django.contrib.auth.models import User
 
 
@@ -10,20 +12,22 @@ class Profile(models.Model):
     department = models.CharField(max_length=100, blank=True, null=True)  # แผนก
     position = models.CharField(max_length=100, blank=True, null=True)  # ตำแหน่ง
 
-    ROLE_CHOICES = [
-        ("EMP", "พนักงาน"),
-        ("ADM", "ธุรการ"),
-    ]
-    role = models.CharField(max_length=3, choices=ROLE_CHOICES, default="EMP")
+    class Role(models.TextChoices):
+        EMP = "EMP", "พนักงาน"
+        ADM = "ADM", "ธุรการ"
 
-    WORK_STATUS_CHOICES = [
-        ("ACTIVE", "ปฏิบัติงานอยู่"),
-        ("INACTIVE", "พ้นสภาพ"),
-    ]
+    ROLE_CHOICES = Role.choices
+    role = models.CharField(max_length=3, choices=Role.choices, default=Role.EMP)
+
+    class WorkStatus(models.TextChoices):
+        ACTIVE = "ACTIVE", "ปฏิบัติงานอยู่"
+        INACTIVE = "INACTIVE", "พ้นสภาพ"
+
+    WORK_STATUS_CHOICES = WorkStatus.choices
     work_status = models.CharField(
         max_length=10,
-        choices=WORK_STATUS_CHOICES,
-        default="ACTIVE"
+        choices=WorkStatus.choices,
+        default=WorkStatus.ACTIVE
     )
 
     def __str__(self):
@@ -39,56 +43,81 @@ class Car(models.Model):
     )  # เลขทะเบียน เช่น 3814
     province_full = models.CharField(max_length=100)  # จังหวัด เช่น ขอนแก่น
 
-    current_odometer = models.IntegerField(default=0)  # เลขไมล์ปัจจุบัน
+    current_odometer = models.PositiveIntegerField(default=0)  # เลขไมล์ปัจจุบัน
 
     brand_name = models.CharField(max_length=100)  # ยี่ห้อ เช่น ISUZU
     model_name = models.CharField(max_length=100)  # รุ่น เช่น D-MAX
 
     color_code = models.CharField(max_length=20, default="#377dff")  # สีที่ใช้ในปฏิทิน
 
-    STATUS_CHOICES = [
-        ("READY", "พร้อมใช้งาน"),
-        ("MAINTENANCE", "ส่งซ่อม"),
-        ("OUT_OF_SERVICE", "งดใช้งาน"),
-        ("RETIRED", "ยกเลิกใช้งาน"),
-    ]
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="READY")
+    class Status(models.TextChoices):
+        READY = "READY", "พร้อมใช้งาน"
+        MAINTENANCE = "MAINTENANCE", "ส่งซ่อม"
+        OUT_OF_SERVICE = "OUT_OF_SERVICE", "งดใช้งาน"
+        RETIRED = "RETIRED", "ยกเลิกใช้งาน"
+
+    STATUS_CHOICES = Status.choices
+    status = models.CharField(
+        max_length=20, choices=Status.choices, default=Status.READY, db_index=True
+    )
 
     seat_count = models.IntegerField(default=5)  # จำนวนที่นั่ง
 
-    GEAR_CHOICES = [
-        ("AUTO", "อัตโนมัติ"),
-        ("MANUAL", "ธรรมดา"),
-    ]
-    gear_type = models.CharField(max_length=10, choices=GEAR_CHOICES, default="AUTO")
+    class Gear(models.TextChoices):
+        AUTO = "AUTO", "อัตโนมัติ"
+        MANUAL = "MANUAL", "ธรรมดา"
+
+    GEAR_CHOICES = Gear.choices
+    gear_type = models.CharField(max_length=10, choices=Gear.choices, default=Gear.AUTO)
 
-    USAGE_CHOICES = [
-        ("POOL", "รถเช่ากฟฉ.1"),
-        ("OFFICE", "รถประจำกอง/ฝ่าย"),
-        ("INSPECT", "รถตรวจการ/ออกตรวจพื้นที่"),
-        ("OTHER", "อื่น ๆ"),
-    ]
-    usage_type = models.CharField(max_length=20, choices=USAGE_CHOICES, default="POOL")
+    class Usage(models.TextChoices):
+        POOL = "POOL", "รถเช่ากฟฉ.1"
+        OFFICE = "OFFICE", "รถประจำกอง/ฝ่าย"
+        INSPECT = "INSPECT", "รถตรวจการ/ออกตรวจพื้นที่"
+        OTHER = "OTHER", "อื่น ๆ"
+
+    USAGE_CHOICES = Usage.choices
+    usage_type = models.CharField(
+        max_length=20, choices=Usage.choices, default=Usage.POOL, db_index=True
+    )
+
+    # ใช้ในหน้า admin_cars.html / ปฏิทิน / admin (DB คำนวณเก็บไว้ให้ ไม่ต้องต่อ string ทุกแถว)
+    display_plate = models.GeneratedField(
+        expression=Concat(
+            "plate_prefix", Value(" "), "plate_number", Value(" "), "province_full"
+        ),
+        output_field=models.CharField(max_length=128),
+        db_persist=True,
+        db_index=True,
+    )
+
+    class Meta:
+        indexes = [
+            # ลำดับการแสดงรถทุกหน้า (order_by plate_prefix, plate_number)
+            models.Index(fields=["plate_prefix", "plate_number"]),
+        ]
 
     def __str__(self):
         return f"{self.plate_prefix} {self.plate_number} ({self.province_full})"
 
-    @property
-    def display_plate(self):
-        # ใช้ในหน้า admin_cars.html
-        return f"{self.plate_prefix} {self.plate_number} {self.province_full}"
-
 
 class Booking(models.Model):
     """การยืมรถแต่ละครั้ง"""
 
-    STATUS_CHOICES = [
-        ("BOOKED", "จองแล้ว"),
-        ("IN_USE", "กำลังใช้งาน"),
-        ("RETURNED", "คืนแล้ว"),
-        ("PENDING_RETURN", "รอคืนรถ"),
-        ("CANCELLED", "ยกเลิก"),
-    ]
+    class Status(models.TextChoices):
+        BOOKED = "BOOKED", "จองแล้ว"
+        IN_USE = "IN_USE", "กำลังใช้งาน"
+        RETURNED = "RETURNED", "คืนแล้ว"
+        PENDING_RETURN = "PENDING_RETURN", "รอคืนรถ"
+        CANCELLED = "CANCELLED", "ยกเลิก"
+
+    STATUS_CHOICES = Status.choices
+
+    # สถานะที่ถือว่า "กันรถ" อยู่ (ใช้เช็กรถว่าง/ปฏิทิน)
+    ACTIVE_STATUSES = (Status.BOOKED, Status.IN_USE)
+
+    # สถานะที่ยังไม่จบ (ยังเริ่มใช้/คืนรถได้)
+    OPEN_STATUSES = (Status.BOOKED, Status.IN_USE, Status.PENDING_RETURN)
 
     car = models.ForeignKey(Car, on_delete=models.PROTECT, related_name="bookings")
     requester = models.ForeignKey(
@@ -100,14 +129,16 @@ class Booking(models.Model):
     destination = models.CharField(max_length=255)  # สถานที่
 
     # เลขไมล์ก่อนและหลังของการยืมครั้งนี้
-    odometer_before = models.IntegerField(
+    odometer_before = models.PositiveIntegerField(
         null=True, blank=True, verbose_name="เลขไมล์ก่อนใช้งาน"
     )
-    odometer_after = models.IntegerField(
+    odometer_after = models.PositiveIntegerField(
         null=True, blank=True, verbose_name="เลขไมล์หลังใช้งาน"
     )
 
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="BOOKED")
+    status = models.CharField(
+        max_length=20, choices=Status.choices, default=Status.BOOKED
+    )
 
     # คนที่เป็นคนส่งคืนรถ
     returned_by = models.ForeignKey(
@@ -127,6 +158,29 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, null=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # เช็กการจองทับช่วงวันของรถแต่ละคัน
+            models.Index(fields=["car", "start_date"]),
+            # ค้นหาการจองตามช่วงวัน (ปฏิทิน/รายงานรายเดือน)
+            models.Index(fields=["start_date", "end_date"]),
+            # รายการจองรายเดือนของ admin (กรอง/เรียงตาม end_date แยกสถานะหรือรายคัน)
+            models.Index(fields=["status", "end_date"]),
+            models.Index(fields=["car", "end_date"]),
+            # คืนรถในเดือนที่เลือก (status=RETURNED + ช่วงของ updated_at) หน้าตรวจรายเดือน
+            models.Index(fields=["status", "updated_at"]),
+            # เช็กรถว่าง: การจองที่ยังกันรถอยู่ (ACTIVE_STATUSES) ทับช่วงวันของรถคันนั้น
+            models.Index(
+                fields=["car", "status", "start_date"],
+                name="booking_overlap_idx",
+            ),
+            # การจองของผู้ขอ เรียงใหม่ -> เก่า (dropdown หน้าเริ่มใช้งาน/คืนรถ กรองสถานะที่ยังไม่จบต่อ)
+            models.Index(
+                fields=["requester", "-start_date", "-created_at"],
+                name="booking_active_user_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.car} ({self.start_date} - {self.end_date})"
 
@@ -143,7 +197,7 @@ class FuelRefill(models.Model):
         related_name="fuel_refills",
     )
 
-    refill_date = models.DateField()  # วันที่เติม
+    refill_date = models.DateField(db_index=True)  # วันที่เติม
     fuel_place = models.CharField(
         "สถานที่เติมน้ำมัน", max_length=255, blank=True, default=""
     )
@@ -153,7 +207,7 @@ class FuelRefill(models.Model):
     total_price = models.DecimalField(
         max_digits=9, decimal_places=2, help_text="ราคารวมที่จ่าย"
     )
-    odometer = models.IntegerField(help_text="เลขไมล์ ณ ตอนเติม")
+    odometer = models.PositiveIntegerField(help_text="เลขไมล์ ณ ตอนเติม")
 
     # ✅ เลข ยพ. กรอก/โชว์เฉพาะงานเติมน้ำมัน
     yp_number = models.CharField(max_length=50, verbose_name="เลข ยพ.", blank=True)
@@ -168,5 +222,12 @@ class FuelRefill(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["car", "refill_date"]),
+            # MIN/MAX เลขไมล์ต่อคันใน audit
+            models.Index(fields=["car", "odometer"]),
+        ]
+
     def __str__(self):
         return f"{self.car} @ {self.refill_date}"
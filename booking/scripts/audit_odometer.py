@@ -1,5 +1,5 @@
 from booking.models import Car
-from booking.utils.audit import month_range, audit_car_month
+from booking.utils.audit import format_issue, month_range, audit_month
 
 
 def run(*args):
@@ -19,10 +19,18 @@ def run(*args):
     start, end = month_range(year, month)
     print(f"🔎 Audit เดือน {month:02d}/{year} | ช่วง {start} ถึง {end}")
 
-    for car in Car.objects.all().order_by("plate_prefix", "plate_number"):
-        issues = audit_car_month(car, start, end, gap_threshold_km=200)
+    cars = list(
+        Car.objects.only(
+            "id", "plate_prefix", "plate_number", "province_full"
+        ).order_by("plate_prefix", "plate_number")
+    )
+    # ดึงทริป/เติมน้ำมันของทั้งเดือนทีเดียว แทนการ query ทีละคัน
+    issues_by_car = audit_month(cars, start, end, gap_threshold_km=200)
+
+    for car in cars:
+        issues = issues_by_car[car.id]
         if issues:
             print("\n==============================")
             print(f"🚗 รถ: {car}")
             for it in issues:
-                print(" -", it["message"], "| ช่วง:", it["date_range"])
+                print(" -", format_issue(it), "| ช่วง:", it["date_range"])
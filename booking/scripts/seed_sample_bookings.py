@@ -1,3 +1,4 @@
+from collections import defaultdict
 from datetime import date, timedelta
 from decimal import Decimal
 import random
@@ -7,6 +8,7 @@ from django.db import transaction
 from django.db.models import Q
 
 from booking.models import Booking, Car, FuelRefill, Profile
+from booking.utils.audit import invalidate_audit_cache
 
 
 def run():
@@ -30,17 +32,16 @@ def run():
         # users
         # =========================
         def ensure_user(username, password="1234", first="", last="", role="EMP"):
-            u, _ = User.objects.get_or_create(username=username)
-            u.set_password(password)
-            u.first_name = first
-            u.last_name = last
-            u.is_active = True
-            u.save()
-
-            p, _ = Profile.objects.get_or_create(user=u)
-            if hasattr(p, "role"):
-                p.role = role
-            p.save()
+            u, created = User.objects.get_or_create(
+                username=username,
+                defaults={"first_name": first, "last_name": last, "is_active": True},
+            )
+            # hash รหัสผ่าน (PBKDF2) เฉพาะ user ที่เพิ่งสร้าง
+            if created:
+                u.set_password(password)
+                u.save(update_fields=["password"])
+
+            Profile.objects.update_or_create(user=u, defaults={"role": role})
             return u
 
         # ตัวหลักสำหรับ demo
@@ -97,28 +98,25 @@ def run():
             "งค-3806": 380601,
         }
 
-        # ตัวนับเลขยพต่อคัน
-        yp_counters = {}
-        for c in cars:
-            key = f"{c.plate_prefix}-{c.plate_number}"
-            yp_counters[key] = int(YP_START_BY_CAR.get(key, 100001))
+        # ตัวนับเลขยพต่อคัน (key = car.id)
+        yp_counters = {
+            c.id: int(YP_START_BY_CAR.get(f"{c.plate_prefix}-{c.plate_number}", 100001))
+            for c in cars
+        }
 
         def next_yp_for_car(car: Car) -> str:
-            key = f"{car.plate_prefix}-{car.plate_number}"
-            cur = int(yp_counters.get(key, 100001))
-            yp_counters[key] = cur + 1
+            cur = yp_counters[car.id]
+            yp_counters[car.id] = cur + 1
             # ให้เป็นเลข 6 หลัก (ถ้าอยากไม่ pad ก็ return str(cur))
-            return str(cur).zfill(6)
+            return f"{cur:06d}"
 
         # =========================
-        # overlap check
+        # overlap check (เก็บช่วงวันที่จองไว้ในหน่วยความจำต่อคัน ไม่ต้อง query)
         # =========================
+        intervals = defaultdict(list)
+
         def is_overlapping(car, start_d, end_d):
-            return Booking.objects.filter(
-                car=car,
-                start_date__lte=end_d,
-                end_date__gte=start_d,
-            ).exists()
+            return any(s <= end_d and e >= start_d for s, e in intervals[car.id])
 
         # =========================
         # fuel refill
@@ -126,7 +124,8 @@ def run():
         PRICE_POOL = [Decimal("38.00"), Decimal("39.50"), Decimal("40.10")]
         FUEL_PLACES = ["PTT", "บางจาก", "เชลล์", "คาลเท็กซ์"]
 
-        def add_fuel_refill(booking, odo_min, odo_max, refill_date):
+        def build_fuel_refill(booking, odo_min, odo_max, refill_date):
+            """สร้าง FuelRefill (ยังไม่ save) ให้ไป bulk_create พร้อมกันตอนท้าย"""
             liters = Decimal(str(random.choice([15, 20, 25, 28, 30, 35])))
             ppl = random.choice(PRICE_POOL)
             total = (liters * ppl).quantize(Decimal("0.01"))
@@ -146,7 +145,7 @@ def run():
             if hasattr(FuelRefill, "yp_number"):
                 data["yp_number"] = next_yp_for_car(booking.car)
 
-            FuelRefill.objects.create(**data)
+            return FuelRefill(**data)
 
         # =========================
         # bookings: car-centric schedule (กระจายทั้งเดือน ไม่ชน)
@@ -166,7 +165,9 @@ def run():
             "ประชุม/ส่งเอกสาร",
         ]
 
-        created = 0
+        # สะสมไว้แล้ว insert ทีเดียวตอนท้าย
+        pending_bookings = []
+        pending_refills = []
 
         for car in cars:
             # ต่อคันมี booking 7–11 รายการ
@@ -178,7 +179,9 @@ def run():
                 if cursor > last:
                     break
 
-                length = random.choice([1, 1, 2, 2, 3])
+                # 1 วัน 40% / 2 วัน 40% / 3 วัน 20%
+                r = random.random()
+                length = 1 if r < 0.40 else 2 if r < 0.80 else 3
                 start_d = cursor
                 end_d = min(last, start_d + timedelta(days=length - 1))
 
@@ -199,7 +202,7 @@ def run():
 
                 requester = pick_requester()
 
-                b = Booking.objects.create(
+                b = Booking(
                     car=car,
                     requester=requester,
                     start_date=start_d,
@@ -225,34 +228,43 @@ def run():
                         set_if_exists(b, "odometer_after", odo_after)
                         set_if_exists(b, "mileage_after", odo_after)
 
-                    b.save()
-
                     # เติมน้ำมัน: 0–3 ครั้งต่อเคส (ให้เหมือนไปราชการจริง)
                     # RETURNED: เติมบ่อยหน่อย
                     # PENDING_RETURN: มีโอกาสเติมแล้วแต่ยังไม่กดยืนยัน
+                    # (สุ่มครั้งเดียวแล้วเทียบกับเกณฑ์สะสมของน้ำหนัก 20/45/25/10 และ 55/35/10)
+                    r = random.random()
                     if status in ("RETURNED", "PENDING_RETURN"):
-                        n = random.choices([0, 1, 2, 3], weights=[20, 45, 25, 10])[0]
+                        n = 0 if r < 0.20 else 1 if r < 0.65 else 2 if r < 0.90 else 3
                     else:
-                        n = random.choices([0, 1, 2], weights=[55, 35, 10])[0]
+                        n = 0 if r < 0.55 else 1 if r < 0.90 else 2
 
                     day_span = max(0, (end_d - start_d).days)
                     for _i in range(n):
                         refill_date = start_d + timedelta(
                             days=random.randint(0, day_span)
                         )
-                        add_fuel_refill(b, odo_before, odo_after, refill_date)
+                        pending_refills.append(
+                            build_fuel_refill(b, odo_before, odo_after, refill_date)
+                        )
 
-                created += 1
+                pending_bookings.append(b)
+                intervals[car.id].append((start_d, end_d))
 
                 gap = random.choice([0, 1, 1, 2])
                 cursor = end_d + timedelta(days=1 + gap)
 
+        # bulk_create คืน pk ให้ booking -> refill ที่อ้างถึง booking ใช้ต่อได้เลย
+        Booking.objects.bulk_create(pending_bookings, batch_size=500)
+        FuelRefill.objects.bulk_create(pending_refills, batch_size=500)
+        # bulk_create ไม่ส่ง post_save -> ทิ้ง cache ผลตรวจเอง
+        invalidate_audit_cache()
+
         # เซ็ตสถานะรถให้ READY ไว้ก่อน (รถพร้อมโชว์ในหน้าเลือก)
         for c in cars:
             set_if_exists(c, "status", "READY")
             c.save()
 
         print("✅ DONE")
-        print("   - bookings:", created)
-        print("   - fuel refills:", FuelRefill.objects.count())
+        print("   - bookings:", len(pending_bookings))
+        print("   - fuel refills:", len(pending_refills))
         print("   - yp starts:", YP_START_BY_CAR)
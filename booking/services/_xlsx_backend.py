@@ -0,0 +1,553 @@
+from __future__ import annotations
+
+import os
+from copy import copy
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Iterable, Optional
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+try:
+    import xlsxwriter
+except ImportError:  # ยังใช้ตัวเขียนแบบ openpyxl write-only ได้
+    xlsxwriter = None
+
+from .report_fuel_excel import (
+    COL_WIDTHS,
+    COLS,
+    DEFAULT_MAX_ROWS,
+    TABLE_HEADER_TOP,
+    TH_FONT,
+    _apply_a4_one_page,
+    _refill_values,
+    _style_array,
+    _to_float,
+    save_workbook_fast,
+)
+
+
+# เส้นขอบของ xlsxwriter เป็นเลข index (1=thin, 2=medium, 4=dotted)
+_THIN = 1
+_THICK = 2
+_DOTTED = 4
+
+# index ของ xlsxwriter -> ชื่อเส้นของ openpyxl
+_SIDE_STYLE = {_THIN: "thin", _THICK: "medium", _DOTTED: "dotted"}
+
+
+# =========================
+# Helpers
+# =========================
+@lru_cache(maxsize=8)
+def _template_layout(template_path: str, mtime: float):
+    """
+    อ่าน template ด้วย openpyxl แค่ครั้งเดียว (cache ตาม mtime)
+    คืนชื่อ sheet + ค่าที่มีอยู่ใน template เพื่อเขียนรองพื้นก่อนลงข้อมูลจริง
+    """
+    wb = load_workbook(template_path, read_only=True)
+    try:
+        ws = wb.active
+        values = {
+            (c.row, c.column - 1): c.value
+            for row in ws.iter_rows()
+            for c in row
+            if getattr(c, "value", None) is not None
+        }
+        return ws.title, values
+    finally:
+        wb.close()
+
+
+class _Formats:
+    """add_format ครั้งเดียวต่อชุด style ที่เหมือนกัน แล้วใช้ซ้ำทุกแถว"""
+
+    def __init__(self, wb):
+        self._wb = wb
+        self._cache = {}
+
+    def __call__(self, props: tuple | None):
+        if not props:
+            return None
+        fmt = self._cache.get(props)
+        if fmt is None:
+            fmt = self._cache[props] = self._wb.add_format(dict(props))
+        return fmt
+
+
+def _font(*, bold: bool = False, size: int = 12) -> dict:
+    return {"font_name": TH_FONT, "font_size": size, "bold": bold}
+
+
+def _box(r: int, c: int, top: int, bottom: int) -> dict:
+    """เส้นขอบของ cell ในตาราง: ขอบนอกหนา ข้างในบาง"""
+    return {
+        "left": _THICK if c == 0 else _THIN,
+        "right": _THICK if c == len(COLS) - 1 else _THIN,
+        "top": _THICK if r == top else _THIN,
+        "bottom": _THICK if r == bottom else _THIN,
+        "border_color": "#000000",
+    }
+
+
+class _Layout:
+    """
+    ผลลัพธ์ของการจัดหน้ารายงาน (ยังไม่ผูกกับไลบรารีไหน)
+    - cells: {(row, col): (value, props)} แถว 1-based, คอลัมน์ 0-based
+    - props เป็น tuple ของ format แบบ xlsxwriter (sorted) หรือ None
+    """
+
+    def __init__(self, sheet_title: str):
+        self.sheet_title = sheet_title
+        self.cells: dict[tuple[int, int], tuple[Any, tuple | None]] = {}
+        self.merges: list[tuple[int, int, int, int]] = []
+        self.heights: dict[int, float] = {}
+        self.last_row = 1
+
+
+def _fmt(**props) -> tuple:
+    # props แบบเดียวกับ xlsxwriter.add_format แต่ hash ได้ (ใช้เป็น key ของ cache)
+    return tuple(sorted(props.items()))
+
+
+# =========================
+# Layout (ใช้ร่วมกันทั้ง xlsxwriter และ openpyxl write-only)
+# =========================
+def _fuel_layout(
+    template_path: str,
+    title_text: str,
+    meta_text: str,
+    odo_start: int | None = None,
+    refills: Optional[Iterable[Any]] = None,
+    *,
+    max_rows: int = DEFAULT_MAX_ROWS,
+    summary_row: int | None = None,
+    user_role_label: str = "กดส.1",
+    driver_name: str = "",
+    controller_name: str = "",
+    controller_position: str = "พนัก.6 กดส.1",
+    note_line1: str = "ใช้เป็นรถประจำ  กดส.1  และใช้ในราชการเท่านั้น",
+    note_line2: str = "(ไม่ได้ใช้เป็นรถประจำตำแหน่ง)",
+) -> _Layout:
+    """
+    จัดหน้าเหมือน build_fuel_excel (openpyxl) ทุกอย่าง แต่เก็บเป็นข้อมูลล้วน
+    แล้วให้ตัวเขียนไฟล์แต่ละแบบ (_emit_*) เอาไปเขียนเรียงแถวทีเดียว
+    """
+    if refills is None:
+        refills = []
+
+    sheet_title, template_values = _template_layout(
+        template_path, os.path.getmtime(template_path)
+    )
+
+    layout = _Layout(sheet_title)
+    cells = layout.cells
+    fmt = _fmt
+
+    def put(r: int, c: int, value: Any, cell_format=None):
+        cells[(r, c)] = (value, cell_format)
+
+    def merge(r1: int, c1: int, r2: int, c2: int, value: Any, cell_format):
+        # เหมือน merge_range: ทุก cell ในช่วงได้ format ของช่องซ้ายบน
+        layout.merges.append((r1, c1, r2, c2))
+        for r in range(r1, r2 + 1):
+            for c in range(c1, c2 + 1):
+                cells[(r, c)] = (None, cell_format)
+        cells[(r1, c1)] = (value, cell_format)
+
+    def height(r: int, h: float):
+        layout.heights[r] = h
+
+    dotted_underline = {"bottom": _DOTTED, "border_color": "#000000"}
+    vcenter = {"valign": "vcenter"}
+
+    # ค่าที่มีใน template (ถ้าไม่มีอะไรทับ จะเห็นเหมือน openpyxl)
+    for (r, c), value in template_values.items():
+        put(r, c, value)
+
+    # =========================================================
+    # 1) Header บนสุด
+    # =========================================================
+    merge(1, 0, 1, 7, title_text, fmt(**_font(bold=True, size=16), align="center", **vcenter))
+    merge(2, 0, 2, 7, meta_text, fmt(**_font(), align="center", **vcenter))
+    height(1, 22)
+    height(2, 18)
+
+    # =========================================================
+    # 2) เลขไมล์ต้นเดือน/สิ้นเดือน
+    # =========================================================
+    odo_box = fmt(
+        **_font(), num_format="#,##0", align="center", **vcenter, border=_THIN, border_color="#000000"
+    )
+    put(3, 0, "เลขไมล์ต้นเดือน", fmt(**_font(bold=True), align="left", **vcenter, text_wrap=True))
+    put(3, 1, int(odo_start) if odo_start is not None else template_values.get((3, 1)), odo_box)
+    put(3, 6, "เลขไมล์สิ้นเดือน", fmt(**_font(bold=True), align="right", **vcenter))
+    height(3, 18)
+
+    # =========================================================
+    # 3) หัวตาราง 3 ชั้น
+    # =========================================================
+    hdr1 = TABLE_HEADER_TOP
+    hdr2 = hdr1 + 1
+    hdr3 = hdr1 + 2
+    data_start_row = hdr3 + 1
+    table_last_row = data_start_row + max_rows - 1
+    total_row = table_last_row + 1
+
+    def header_fmt(r, c):
+        return fmt(
+            **_font(bold=True),
+            align="center",
+            **vcenter,
+            text_wrap=True,
+            pattern=1,
+            bg_color="#EFEFEF",
+            **_box(r, c, hdr1, total_row),
+        )
+
+    for r in (hdr1, hdr2, hdr3):
+        for c in range(len(COLS)):
+            put(r, c, None, header_fmt(r, c))
+
+    headers = [
+        (hdr1, 0, hdr2, 0, "วันที่\nเติมน้ำมัน"),
+        (hdr1, 1, hdr2, 1, "เลขที่ใบส่งจ่าย\nยพ.1"),
+        (hdr1, 2, hdr1, 3, "น้ำมันเชื้อเพลิงที่ใช้"),
+        (hdr1, 4, hdr1, 5, "น้ำมันหล่อลื่น"),
+        (hdr1, 6, hdr3, 6, "เลข กม.\nที่เติม"),
+        (hdr1, 7, hdr3, 7, "หมายเหตุ"),
+        (hdr3, 0, hdr3, 5, "เลขไมล์ต้นเดือน"),
+    ]
+    for r1, c1, r2, c2, text in headers:
+        merge(r1, c1, r2, c2, text, header_fmt(r1, c1))
+        # merge_range ใส่ format เดียวทั้งช่วง -> เขียนขอบของแต่ละ cell กลับ
+        for r in range(r1, r2 + 1):
+            for c in range(c1, c2 + 1):
+                if (r, c) != (r1, c1):
+                    put(r, c, None, header_fmt(r, c))
+
+    for c, text in ((2, "จำนวนลิตร"), (3, "จำนวนเงิน"), (4, "จำนวนลิตร"), (5, "จำนวนเงิน")):
+        put(hdr2, c, text, header_fmt(hdr2, c))
+
+    height(hdr1, 26)
+    height(hdr2, 20)
+    height(hdr3, 18)
+
+    # =========================================================
+    # 4) Table body (ล็อกจำนวนแถว)
+    # =========================================================
+    def body_fmt(r, c, **props):
+        props.setdefault("valign", "vcenter")
+        return fmt(**_font(), **props, **_box(r, c, hdr1, total_row))
+
+    refills_list = list(refills)[:max_rows]
+
+    fuel_liters_sum = 0.0
+    fuel_money_sum = 0.0
+    lube_liters_sum = 0.0
+    lube_money_sum = 0.0
+    last_odo: Optional[int] = None
+
+    for i in range(max_rows):
+        r = data_start_row + i
+        height(r, 17)
+
+        if i >= len(refills_list):
+            for c in range(len(COLS)):
+                put(r, c, None, body_fmt(r, c, text_wrap=True))
+            continue
+
+        f = refills_list[i]
+        (
+            refill_date,
+            bill_or_yp,
+            fuel_liters,
+            fuel_amount,
+            lube_liters,
+            lube_amount,
+            odometer,
+            remark,
+        ) = _refill_values(f)
+        bill_or_yp = bill_or_yp or ""
+        remark = remark or ""
+
+        fuel_liters = _to_float(fuel_liters)
+        fuel_amount = _to_float(fuel_amount)
+        lube_liters = _to_float(lube_liters)
+        lube_amount = _to_float(lube_amount)
+
+        lube_l = lube_liters if lube_liters is not None else "-"
+        lube_a = lube_amount if lube_amount is not None else "-"
+
+        put(r, 0, refill_date, body_fmt(r, 0, num_format="dd/mm/yyyy", align="center"))
+        put(r, 1, bill_or_yp, body_fmt(r, 1, align="center"))
+        put(r, 2, fuel_liters, body_fmt(r, 2, num_format="#,##0.000", align="right"))
+        put(r, 3, fuel_amount, body_fmt(r, 3, num_format="#,##0.00", align="right"))
+        put(r, 4, lube_l, body_fmt(r, 4, num_format="#,##0.000", align="center" if lube_l == "-" else "right"))
+        put(r, 5, lube_a, body_fmt(r, 5, num_format="#,##0.00", align="center" if lube_a == "-" else "right"))
+        put(r, 6, odometer, body_fmt(r, 6, num_format="#,##0", align="right"))
+        put(r, 7, remark, body_fmt(r, 7, align="left", text_wrap=True))
+
+        fuel_liters_sum += fuel_liters or 0.0
+        fuel_money_sum += fuel_amount or 0.0
+        if lube_liters is not None:
+            lube_liters_sum += lube_liters
+        if lube_amount is not None:
+            lube_money_sum += lube_amount
+
+        if odometer not in (None, ""):
+            try:
+                last_odo = int(odometer)
+            except Exception:
+                pass
+
+    put(3, 7, last_odo, odo_box)
+
+    # =========================================================
+    # 5) แถวรวมใต้ตาราง
+    # =========================================================
+    height(total_row, 18)
+    totals = {
+        2: (fuel_liters_sum if fuel_liters_sum > 0 else None, "#,##0.000"),
+        3: (fuel_money_sum if fuel_money_sum > 0 else None, "#,##0.00"),
+        4: (lube_liters_sum if lube_liters_sum > 0 else None, "#,##0.000"),
+        5: (lube_money_sum if lube_money_sum > 0 else None, "#,##0.00"),
+        6: (last_odo, "#,##0"),
+    }
+    for c in range(len(COLS)):
+        if c in totals:
+            value, num_format = totals[c]
+            total_fmt = fmt(
+                **_font(bold=True),
+                num_format=num_format,
+                align="right",
+                **vcenter,
+                **_box(total_row, c, hdr1, total_row),
+            )
+            put(total_row, c, value, total_fmt)
+        else:
+            put(total_row, c, None, body_fmt(total_row, c, align="center"))
+
+    # =========================================================
+    # 6) สรุปด้านล่าง (เส้นจุด)
+    # =========================================================
+    distance = None
+    if last_odo is not None and odo_start is not None:
+        distance = float(last_odo) - float(odo_start)
+
+    avg_km_per_liter = None
+    if distance is not None and fuel_liters_sum > 0:
+        avg_km_per_liter = distance / fuel_liters_sum
+
+    r1 = summary_row if isinstance(summary_row, int) else (total_row + 2)
+    r2 = r1 + 1
+    r3 = r1 + 2
+    r4 = r1 + 3
+
+    for rr in (r1, r2, r3, r4):
+        height(rr, 18)
+
+    def dash_or_value(v: float):
+        return "-" if v <= 0 else v
+
+    label_fmt = fmt(**_font(bold=True))
+
+    def summary_value(num_format):
+        return fmt(
+            **_font(bold=True),
+            num_format=num_format,
+            align="right",
+            **vcenter,
+            **dotted_underline,
+        )
+
+    for rr, label, liters, money in (
+        (r1, "น้ำมันเชื้อเพลิงรวม", fuel_liters_sum, fuel_money_sum),
+        (r2, "น้ำมันหล่อลื่นรวม", lube_liters_sum, lube_money_sum),
+    ):
+        put(rr, 0, label, label_fmt)
+        put(rr, 2, dash_or_value(liters), summary_value("#,##0.000"))
+        put(rr, 3, "ลิตร")
+        put(rr, 4, "เป็นเงิน")
+        put(rr, 5, dash_or_value(money), summary_value("#,##0.00"))
+        put(rr, 6, "บาท")
+
+    put(r3, 0, "ระยะทางการใช้รถยนต์ในรอบเดือน", label_fmt)
+    put(r3, 2, distance if distance is not None else "", summary_value("#,##0.00"))
+    put(r3, 3, "กม.")
+
+    put(r4, 0, "เฉลี่ยการใช้น้ำมันเชื้อเพลิง", label_fmt)
+    put(r4, 2, avg_km_per_liter if avg_km_per_liter is not None else "", summary_value("#,##0.00"))
+    put(r4, 3, "กม./ลิตร")
+
+    # =========================================================
+    # 7) ลายเซ็น + หมายเหตุ
+    # =========================================================
+    sig_row = r4 + 2
+    height(sig_row, 18)
+    height(sig_row + 1, 18)
+
+    text_fmt = fmt(**_font())
+    line_fmt = fmt(**dotted_underline)
+    left_fmt = fmt(**_font(), align="left", **vcenter, text_wrap=True)
+    center_fmt = fmt(**_font(), align="center", **vcenter)
+
+    put(sig_row, 0, f"ลงชื่อ {user_role_label}", left_fmt)
+    put(sig_row, 1, "", line_fmt)
+    put(sig_row, 2, "", line_fmt)
+    put(sig_row, 3, "(ผู้ใช้รถยนต์)", text_fmt)
+    put(sig_row, 4, "ลงชื่อ", text_fmt)
+    put(sig_row, 5, "", line_fmt)
+    put(sig_row, 6, "", line_fmt)
+    put(sig_row, 7, "(ผู้ควบคุมการใช้รถยนต์/พหน.)", text_fmt)
+
+    name_row = sig_row + 1
+    merge(
+        name_row, 0, name_row, 3,
+        f"( {driver_name} )" if driver_name else "(                         )",
+        center_fmt,
+    )
+    merge(
+        name_row, 4, name_row, 7,
+        f"( {controller_name} )   {controller_position}" if controller_name else f"(                         )   {controller_position}",
+        center_fmt,
+    )
+
+    note_row = name_row + 2
+    height(note_row, 18)
+    height(note_row + 1, 18)
+
+    put(note_row, 0, "หมายเหตุ:-", fmt(**_font(bold=True), align="left", **vcenter, text_wrap=True))
+    merge(note_row, 1, note_row, 7, note_line1, left_fmt)
+    merge(note_row + 1, 1, note_row + 1, 7, note_line2, left_fmt)
+
+    layout.last_row = note_row + 2
+    return layout
+
+
+# =========================
+# Writers
+# =========================
+def build_fuel_excel_xlsxwriter(*args, **kwargs) -> BytesIO:
+    """
+    หน้าตาเหมือน build_fuel_excel (openpyxl) ทุกอย่าง แต่เขียนด้วย xlsxwriter
+    - format สร้างครั้งเดียวแล้วใช้ซ้ำ ไม่ต้อง set font/border ทีละ cell
+    - รับ argument ชุดเดียวกับ build_fuel_excel
+    """
+    layout = _fuel_layout(*args, **kwargs)
+
+    bio = BytesIO()
+    wb = xlsxwriter.Workbook(bio, {"in_memory": True})
+    ws = wb.add_worksheet(layout.sheet_title)
+    as_format = _Formats(wb)
+
+    for r1, c1, r2, c2 in layout.merges:
+        value, props = layout.cells[(r1, c1)]
+        ws.merge_range(r1 - 1, c1, r2 - 1, c2, value, as_format(props))
+    # เขียนทับ cell ใน merge ด้วย (ขอบของแต่ละ cell ไม่เท่ากัน)
+    for (r, c), (value, props) in layout.cells.items():
+        ws.write(r - 1, c, value, as_format(props))
+    for r, h in layout.heights.items():
+        ws.set_row(r - 1, h)
+
+    # openpyxl เขียน width ดิบลงไฟล์ แต่ xlsxwriter บวก padding ให้เอง
+    # -> กำหนดเป็น pixel (7px/ตัวอักษร) ให้กว้างเท่าฝั่ง openpyxl
+    for i, w in enumerate(COL_WIDTHS):
+        ws.set_column_pixels(i, i, round(w * 7))
+
+    ws.set_paper(9)  # A4
+    ws.set_portrait()
+    ws.fit_to_pages(1, 1)
+    ws.hide_gridlines(2)
+    ws.center_horizontally()
+    ws.set_margins(left=0.30, right=0.30, top=0.40, bottom=0.40)
+    ws.set_header(margin=0.20)
+    ws.set_footer(margin=0.20)
+    ws.print_area(0, 0, layout.last_row - 1, len(COLS) - 1)
+
+    wb.close()
+    bio.seek(0)
+    return bio
+
+
+@lru_cache(maxsize=None)
+def _openpyxl_styles(props: tuple) -> dict:
+    """แปลง props แบบ xlsxwriter เป็น style object ของ openpyxl (ครั้งเดียวต่อชุด)"""
+    p = dict(props)
+    styles = {}
+    if "font_name" in p:
+        styles["font"] = Font(name=p["font_name"], size=p["font_size"], bold=p["bold"])
+    if "num_format" in p:
+        styles["number_format"] = p["num_format"]
+
+    align = {}
+    if "align" in p:
+        align["horizontal"] = p["align"]
+    if "valign" in p:
+        align["vertical"] = "center" if p["valign"] == "vcenter" else p["valign"]
+    if p.get("text_wrap"):
+        align["wrap_text"] = True
+    if align:
+        styles["alignment"] = Alignment(**align)
+
+    color = p.get("border_color", "#000000").lstrip("#")
+    # "border" ของ xlsxwriter = ทั้ง 4 ด้าน (ด้านที่ระบุเองมีผลก่อน)
+    sides = {
+        edge: Side(style=_SIDE_STYLE[p.get(edge, p.get("border"))], color=color)
+        for edge in ("left", "right", "top", "bottom")
+        if edge in p or "border" in p
+    }
+    if sides:
+        styles["border"] = Border(**sides)
+    if p.get("pattern") == 1:
+        styles["fill"] = PatternFill("solid", fgColor=p["bg_color"].lstrip("#"))
+    return styles
+
+
+def build_fuel_excel_writeonly(*args, **kwargs) -> BytesIO:
+    """
+    หน้าตาเหมือน build_fuel_excel แต่เขียนด้วย openpyxl แบบ write-only
+    - ไม่เปิด template เป็น workbook ปกติ (ไม่สร้าง Cell ทั้ง sheet ค้างไว้ใน memory)
+    - เขียนเรียงแถวจากบนลงล่างทีเดียว ด้วย ws.append(...)
+    """
+    layout = _fuel_layout(*args, **kwargs)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(layout.sheet_title)
+
+    # ส่วนหัวของ sheet (คอลัมน์, page setup) ถูกเขียนตอน append แถวแรก -> ตั้งก่อน
+    for i, w in enumerate(COL_WIDTHS, start=1):
+        ws.column_dimensions[COLS[i - 1]].width = w
+    for r, h in layout.heights.items():
+        ws.row_dimensions[r].height = h
+    _apply_a4_one_page(ws, last_row=layout.last_row)
+
+    style_arrays = {}
+
+    def make_cell(value, props):
+        cell = WriteOnlyCell(ws, value=value)
+        if props:
+            sa = style_arrays.get(props)
+            if sa is None:
+                sa = style_arrays[props] = _style_array(ws, **_openpyxl_styles(props))
+            cell._style = copy(sa)
+        return cell
+
+    rows: dict[int, dict[int, Any]] = {}
+    for (r, c), (value, props) in layout.cells.items():
+        rows.setdefault(r, {})[c] = make_cell(value, props)
+
+    last_row = max(max(rows, default=0), max(layout.heights, default=0))
+    for r in range(1, last_row + 1):
+        row = rows.get(r)
+        if not row:
+            ws.append([])
+            continue
+        ws.append([row.get(c) for c in range(max(row) + 1)])
+
+    for r1, c1, r2, c2 in layout.merges:
+        ws.merged_cells.add(f"{COLS[c1]}{r1}:{COLS[c2]}{r2}")
+
+    return save_workbook_fast(wb)
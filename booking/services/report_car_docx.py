@@ -1,153 +1,203 @@
 from __future__ import annotations
 
+import os
+import re
+import zipfile
+from copy import deepcopy
+from bisect import bisect_right
+from functools import lru_cache
 from io import BytesIO
+from itertools import accumulate
 from typing import Dict
 
-from docx import Document
-from docx.oxml import OxmlElement, ns
-from docx.oxml.ns import qn
+from lxml import etree
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.text.paragraph import Paragraph
+
+# part ใน .docx ที่มีข้อความให้ replace
+_TEXT_PARTS = re.compile(r"word/(document|header\d*|footer\d*)\.xml")
+
+_W_P = qn("w:p")
+_W_T = qn("w:t")
+_W_SZ = qn("w:sz")
+_W_TCBORDERS = qn("w:tcBorders")
+
+# เส้นขอบล่างของช่องเลขไมล์ (ค่า default) ไว้ clone ใช้
+_BOTTOM_TEMPLATE = parse_xml(
+    f'<w:bottom {nsdecls("w")} w:val="single" w:sz="8" w:space="0" w:color="000000"/>'
+)
 
 
 # =========================================================
 # Token replace (รองรับ run แตก)
 # =========================================================
-def _replace_in_paragraph(paragraph, mapping: dict[str, str]) -> None:
+@lru_cache(maxsize=32)
+def _token_pattern(tokens: frozenset[str]) -> re.Pattern | None:
+    """
+    regex เดียวครอบทุก token (token ยาวขึ้นก่อน กัน token สั้นไปจับบางส่วน)
+    ชุด token เหมือนเดิมทุกครั้ง (ต่างกันแค่ค่า) -> sort + compile ครั้งเดียวแล้ว cache
+    """
+    if not tokens:
+        return None
+    return re.compile(
+        "|".join(re.escape(k) for k in sorted(tokens, key=lambda k: (-len(k), k)))
+    )
+
+
+def _replace_in_paragraph(paragraph, pattern: re.Pattern, values: dict[str, str]) -> None:
+    """
+    หา token ทั้งหมดในรอบเดียวจากข้อความรวมของทุก run แล้วแก้เฉพาะ run ที่โดน
+    - token อยู่ใน run เดียว: แทนที่ตรงนั้น
+    - token คร่อมหลาย run: ค่าใหม่ไปอยู่ run แรก, run กลางว่าง, run ท้ายเหลือส่วนที่เกิน
+    (format ของแต่ละ run ยังอยู่ครบ)
+    """
     runs = paragraph.runs
     if not runs:
         return
 
-    items = sorted(
-        ((str(k), "" if v is None else str(v)) for k, v in mapping.items()),
-        key=lambda kv: len(kv[0]),
-        reverse=True,
-    )
+    texts = [r.text or "" for r in runs]
+    matches = list(pattern.finditer("".join(texts)))
+    if not matches:
+        return
 
-    def rebuild():
-        texts = [r.text or "" for r in runs]
-        full = "".join(texts)
-        boundaries = []
-        pos = 0
-        for i, t in enumerate(texts):
-            boundaries.append((pos, pos + len(t), i))
-            pos += len(t)
-
-        def run_at(char_pos: int) -> int:
-            for s, e, idx in boundaries:
-                if s <= char_pos < e:
-                    return idx
-            return boundaries[-1][2]
-
-        return full, boundaries, run_at
-
-    for token, value in items:
-        if not token:
+    # starts[i] = ตำแหน่งเริ่มของ run i ในข้อความรวม
+    starts = list(accumulate(map(len, texts), initial=0))
+    new_texts = list(texts)
+    changed = set()
+
+    # ไล่จากขวาไปซ้าย ตำแหน่งของ token ที่อยู่ซ้ายกว่าจะไม่เลื่อน
+    for m in reversed(matches):
+        token_start, token_end = m.span()
+        srun = bisect_right(starts, token_start) - 1
+        erun = bisect_right(starts, token_end - 1) - 1
+
+        left_keep = new_texts[srun][: token_start - starts[srun]]
+        right_keep = new_texts[erun][token_end - starts[erun]:]
+        value = values[m.group(0)]
+
+        if srun == erun:
+            new_texts[srun] = left_keep + value + right_keep
+        else:
+            new_texts[srun] = left_keep + value
+            for i in range(srun + 1, erun):
+                new_texts[i] = ""
+            new_texts[erun] = right_keep
+        changed.update(range(srun, erun + 1))
+
+    for i in sorted(changed):
+        runs[i].text = new_texts[i]
+
+
+def _replace_everywhere(root, pattern: re.Pattern, values: dict[str, str]) -> None:
+    """ทุก <w:p> ใน part นี้ (ย่อหน้า + ตาราง + ตารางซ้อน) ด้วย XPath ครั้งเดียว"""
+    for p_el in root.xpath(".//w:p"):
+        # ย่อหน้าส่วนใหญ่ไม่มี token เลย -> เช็คจากข้อความ <w:t> ดิบ ๆ ก่อน
+        # (เร็วกว่าสร้าง Paragraph/run ทีละตัว) ไม่เจอก็ข้ามไป
+        if not pattern.search("".join(t.text or "" for t in p_el.iter(_W_T))):
             continue
-
-        while True:
-            full, boundaries, run_at = rebuild()
-            at = full.find(token)
-            if at == -1:
-                break
-
-            token_start = at
-            token_end = at + len(token)
-
-            srun = run_at(token_start)
-            erun = run_at(max(token_end - 1, token_start))
-
-            srun_abs = boundaries[srun][0]
-            erun_abs = boundaries[erun][0]
-
-            s_text = runs[srun].text or ""
-            e_text = runs[erun].text or ""
-
-            left_keep = s_text[: max(token_start - srun_abs, 0)]
-            right_keep = e_text[(token_end - erun_abs):]
-
-            if srun == erun:
-                runs[srun].text = left_keep + value + right_keep
-            else:
-                runs[srun].text = left_keep + value
-                for i in range(srun + 1, erun):
-                    runs[i].text = ""
-                runs[erun].text = right_keep
-
-
-def _replace_everywhere(doc: Document, mapping: dict[str, str]) -> None:
-    for p in doc.paragraphs:
-        _replace_in_paragraph(p, mapping)
-
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for p in cell.paragraphs:
-                    _replace_in_paragraph(p, mapping)
-
-    for section in doc.sections:
-        for p in section.header.paragraphs:
-            _replace_in_paragraph(p, mapping)
-        for p in section.footer.paragraphs:
-            _replace_in_paragraph(p, mapping)
+        _replace_in_paragraph(Paragraph(p_el, None), pattern, values)
 
 
 # =========================================================
 # วาดเส้นขอบล่าง (ตัวจบเกม)
 # =========================================================
-def _set_bottom_border(cell, size: str = "8"):
-    tc = cell._tc
+def _set_bottom_border_on_tc(tc, size: str = "8"):
     tcPr = tc.get_or_add_tcPr()
 
-    tcBorders = tcPr.find(qn("w:tcBorders"))
+    tcBorders = tcPr.find(_W_TCBORDERS)
     if tcBorders is None:
         tcBorders = OxmlElement("w:tcBorders")
         tcPr.append(tcBorders)
 
-    bottom = OxmlElement("w:bottom")
-    bottom.set(ns.qn("w:val"), "single")
-    bottom.set(ns.qn("w:sz"), size)
-    bottom.set(ns.qn("w:space"), "0")
-    bottom.set(ns.qn("w:color"), "000000")
+    # clone จากต้นแบบ (lxml deepcopy) แทนการสร้าง element + set attribute ทีละตัว
+    bottom = deepcopy(_BOTTOM_TEMPLATE)
+    if size != "8":
+        bottom.set(_W_SZ, size)
 
     tcBorders.append(bottom)
 
 
-def _apply_mileage_borders(doc: Document, values: set[str]):
+def _tc_text(tc) -> str:
+    """ข้อความใน <w:tc> แบบเดียวกับ cell.text (ย่อหน้าคั่นด้วย \n) แต่อ่านจาก lxml ตรง ๆ"""
+    return "\n".join(
+        "".join(t.text or "" for t in p.iter(_W_T)) for p in tc.iterchildren(_W_P)
+    )
+
+
+def _apply_mileage_borders(root, values: set[str]):
     """
-    ถ้า cell.text ตรงกับค่าเลขไมล์ → ใส่เส้นขอบล่าง
+    ถ้าข้อความใน cell ตรงกับค่าเลขไมล์ → ใส่เส้นขอบล่าง
+    (ดึง <w:tc> ทั้งเอกสารด้วย XPath ครั้งเดียว cell ที่ merge กันจะเจอแค่ครั้งเดียว)
     """
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                text = cell.text.strip()
-                if text in values:
-                    _set_bottom_border(cell)
+    if not values:
+        return
+
+    for tc in root.xpath(".//w:tc"):
+        if _tc_text(tc).strip() in values:
+            _set_bottom_border_on_tc(tc)
 
 
 # =========================================================
 # Public API
 # =========================================================
-def build_car_docx(template_path: str, mapping: Dict[str, str]) -> BytesIO:
+@lru_cache(maxsize=8)
+def _load_template_bytes(template_path: str, mtime: float) -> bytes:
+    """อ่านไฟล์ template ครั้งเดียว (mtime เปลี่ยน = แก้ template แล้ว อ่านใหม่)"""
+    with open(template_path, "rb") as fh:
+        return fh.read()
+
+
+@lru_cache(maxsize=32)
+def _render_car_docx(template_path: str, mtime: float, items: frozenset) -> bytes:
     """
-    สร้างไฟล์ Word รายงานการใช้รถยนต์เช่า
-    - replace token
-    - วาดเส้นเลขไมล์จากโค้ด (ไม่พึ่ง Word)
+    เปิด .docx เป็น zip แล้วแก้เฉพาะ part ที่มีข้อความ (document/header/footer)
+    part อื่น (styles, รูป, theme ฯลฯ) copy ไปตรง ๆ ไม่ต้องโหลด Document ทั้งก้อน
     """
-    doc = Document(template_path)
-
-    # 1) replace token ทุกที่
-    _replace_everywhere(doc, mapping)
+    mapping = dict(items)
+    values = {str(k): "" if v is None else str(v) for k, v in mapping.items() if k}
+    pattern = _token_pattern(frozenset(values))
 
-    # 2) วาดเส้นเฉพาะช่องเลขไมล์
+    # วาดเส้นเฉพาะช่องเลขไมล์
     mileage_values = set()
     if mapping.get("{{MILEAGE_START}}"):
         mileage_values.add(mapping["{{MILEAGE_START}}"])
     if mapping.get("{{MILEAGE_END}}"):
         mileage_values.add(mapping["{{MILEAGE_END}}"])
 
-    _apply_mileage_borders(doc, mileage_values)
-
-    # 3) return file
     bio = BytesIO()
-    doc.save(bio)
-    bio.seek(0)
-    return bio
+    template = BytesIO(_load_template_bytes(template_path, mtime))
+    with zipfile.ZipFile(template) as zin, zipfile.ZipFile(
+        bio, "w", zipfile.ZIP_DEFLATED
+    ) as zout:
+        for info in zin.infolist():
+            data = zin.read(info)
+            name = info.filename
+            if _TEXT_PARTS.fullmatch(name):
+                # parse ด้วย parser ของ python-docx -> ใช้ Paragraph/run.text แบบเดิมได้
+                root = parse_xml(data)
+                # 1) replace token ทุกที่
+                if pattern is not None:
+                    _replace_everywhere(root, pattern, values)
+                # 2) เส้นใต้เลขไมล์ (เฉพาะตัวเอกสาร)
+                if name == "word/document.xml":
+                    _apply_mileage_borders(root, mileage_values)
+                data = etree.tostring(root, encoding="UTF-8", standalone=True)
+            # zlib ระดับ 1 (default 6) -> save เร็วขึ้นมาก ไฟล์ใหญ่ขึ้นนิดเดียว
+            zout.writestr(info, data, compresslevel=1)
+    return bio.getvalue()
+
+
+def build_car_docx(template_path: str, mapping: Dict[str, str]) -> BytesIO:
+    """
+    สร้างไฟล์ Word รายงานการใช้รถยนต์เช่า
+    - replace token
+    - วาดเส้นเลขไมล์จากโค้ด (ไม่พึ่ง Word)
+
+    ผลลัพธ์ขึ้นกับ template + mapping อย่างเดียว -> cache ไฟล์ที่สร้างแล้วไว้
+    (กดดาวน์โหลดซ้ำเดือนเดิมไม่ต้อง parse/replace ใหม่)
+    """
+    data = _render_car_docx(
+        template_path, os.path.getmtime(template_path), frozenset(mapping.items())
+    )
+    return BytesIO(data)
@@ -1,14 +1,26 @@
 from __future__ import annotations
 
+import os
+from copy import copy
+from datetime import datetime, timezone
+from functools import lru_cache
+from operator import attrgetter
 from io import BytesIO
 from decimal import Decimal, InvalidOperation
 from typing import Iterable, Optional, Any
+from zipfile import ZIP_DEFLATED, ZipFile
 
+from django.conf import settings
 from openpyxl import load_workbook
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
 from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.dimensions import ColumnDimension, RowDimension
 from openpyxl.worksheet.page import PageMargins
-from openpyxl.cell.cell import MergedCell
+from openpyxl.worksheet.worksheet import Worksheet
+from openpyxl.writer.excel import ExcelWriter
+from openpyxl.cell.cell import Cell, MergedCell
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.worksheet.cell_range import CellRange
 
 
 TH_FONT = "TH Sarabun New"
@@ -21,20 +33,87 @@ CELL_ODO_EV = "H3"
 TABLE_HEADER_TOP = 5
 DEFAULT_MAX_ROWS = 28
 COLS = "ABCDEFGH"
+COL_WIDTHS = (10.5, 12, 12.5, 11.5, 12.5, 11.5, 11, 13.5)
+
+# ระดับการบีบอัด zip ตอน save (ค่า default ของ zlib = 6)
+# ไฟล์ส่งให้ผู้ใช้ทันที -> ระดับ 1 เร็วกว่ามาก แลกกับไฟล์ใหญ่ขึ้นนิดหน่อย
+ZIP_LEVEL = 1
+
+# =========================
+# Styles (ค่าคงที่ ใช้ร่วมกันทุก workbook ไม่ต้องสร้างใหม่ทุกครั้ง)
+# =========================
+_THIN = Side(style="thin", color="000000")
+_THICK = Side(style="medium", color="000000")
+_DOTTED = Side(style="dotted", color="000000")
+
+_BORDER_THIN = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+_BORDER_DOTTED_BOTTOM = Border(bottom=_DOTTED)
+_BORDER_HDR2 = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THICK)
+_HEADER_FILL = PatternFill("solid", fgColor="EFEFEF")
+
+_ALIGN_CENTER_WRAP = Alignment(horizontal="center", vertical="center", wrap_text=True)
+_ALIGN_CENTER = Alignment(horizontal="center", vertical="center")
+_ALIGN_LEFT = Alignment(horizontal="left", vertical="center", wrap_text=True)
+_ALIGN_RIGHT = Alignment(horizontal="right", vertical="center")
+_ALIGN_BODY = Alignment(vertical="center", wrap_text=True)
+
+# (number_format, alignment) ของแต่ละแบบ cell ในแถวข้อมูล
+_BODY_STYLES = {
+    "date": ("dd/mm/yyyy", _ALIGN_CENTER),
+    "text": ("General", _ALIGN_CENTER),
+    "liters": ("#,##0.000", _ALIGN_RIGHT),
+    "baht": ("#,##0.00", _ALIGN_RIGHT),
+    "liters_dash": ("#,##0.000", _ALIGN_CENTER),
+    "baht_dash": ("#,##0.00", _ALIGN_CENTER),
+    "km": ("#,##0", _ALIGN_RIGHT),
+    "remark": ("General", _ALIGN_LEFT),
+}
+
+
+# field ของ FuelRefill ที่ใช้ในแถวข้อมูล (ตามลำดับคอลัมน์)
+_REFILL_FIELDS = (
+    "refill_date",
+    "yp_number",
+    "liters",
+    "total_price",
+    "lube_liters",
+    "lube_total_price",
+    "odometer",
+    "remark",
+)
+_REFILL_GET = attrgetter(*_REFILL_FIELDS)
 
 
 # =========================
 # Helpers
 # =========================
+def _refill_values(f: Any) -> tuple:
+    """
+    ดึงค่าทุก field ของ refill 1 แถวในครั้งเดียว (attrgetter ทำใน C)
+    object ที่ไม่มีบาง field (เช่นข้อมูลจำลอง) -> field นั้นเป็น None
+    """
+    try:
+        return _REFILL_GET(f)
+    except AttributeError:
+        return tuple(getattr(f, name, None) for name in _REFILL_FIELDS)
+
+
+_COMMA = str.maketrans("", "", ",")
+
+
 def _to_float(x: Any) -> Optional[float]:
+    # ชนิดที่เจอบ่อยสุดจาก DB มาก่อน ไม่ต้องผ่าน str()
+    cls = x.__class__
+    if cls is float:
+        return x
+    if cls is Decimal or cls is int:
+        return float(x)
     if x is None:
         return None
-    if isinstance(x, (int, float)):
-        return float(x)
-    if isinstance(x, Decimal):
+    if isinstance(x, (int, float, Decimal)):
         return float(x)
     try:
-        s = str(x).strip().replace(",", "")
+        s = str(x).strip().translate(_COMMA)
         if s == "":
             return None
         return float(s)
@@ -42,43 +121,131 @@ def _to_float(x: Any) -> Optional[float]:
         return None
 
 
+@lru_cache(maxsize=None)
+def _font(bold: bool, size: int) -> Font:
+    # Font ชุดเดียวกันใช้ object เดิม ไม่ต้องสร้างใหม่ทุก cell
+    return Font(name=TH_FONT, bold=bold, size=size)
+
+
 def _set_font(cell, *, bold: bool = False, size: int = 12):
-    cell.font = Font(name=TH_FONT, bold=bold, size=size)
+    cell.font = _font(bold, size)
 
 
-def safe_write(ws, addr: str, value: Any):
+def _style_array(ws, **styles) -> StyleArray:
+    """
+    ตั้ง style ลง cell ชั่วคราวครั้งเดียว แล้วคืน StyleArray (index ใน style table)
+    ไว้ copy ใส่ cell._style ของ cell อื่น ไม่ต้องผ่าน setter ทีละ property
+    """
+    scratch = Cell(ws)
+    for name, value in styles.items():
+        setattr(scratch, name, value)
+    return scratch._style
+
+
+def safe_write(ws, addr: str | tuple[int, int], value: Any):
     """
     ✅ กัน 'MergedCell value is read-only'
     ถ้า addr อยู่ใน merged range แล้วไม่ใช่ช่องซ้ายบน -> เขียนไปที่ช่องซ้ายบนแทน
+    addr เป็น "A1" หรือ (row, column) ก็ได้ (แบบ tuple ไม่ต้อง parse string)
     """
-    cell = ws[addr]
+    if isinstance(addr, str):
+        cell = ws[addr]
+    else:
+        cell = ws.cell(row=addr[0], column=addr[1])
     if isinstance(cell, MergedCell):
-        for rng in ws.merged_cells.ranges:
-            if addr in rng:
-                tl = ws.cell(row=rng.min_row, column=rng.min_col)
-                tl.value = value
-                return tl
-        return cell
+        # ช่วงที่ merge ผ่าน merge() รู้ช่องซ้ายบนทันที ไม่ต้องไล่ทุก range
+        top_left = _merged_index(ws).get((cell.row, cell.column))
+        if top_left is None:
+            for rng in ws.merged_cells.ranges:
+                if cell.coordinate in rng:
+                    top_left = (rng.min_row, rng.min_col)
+                    break
+        if top_left is None:
+            return cell
+        tl = ws.cell(row=top_left[0], column=top_left[1])
+        tl.value = value
+        return tl
     cell.value = value
     return cell
 
 
+def _merged_index(ws) -> dict:
+    # (row, column) ของทุกช่องใน merged range -> (row, column) ช่องซ้ายบน
+    return ws.__dict__.setdefault("_safe_merged_topleft", {})
+
+
+def merge(ws, rng_str: str):
+    """ws.merge_cells + จำช่องซ้ายบนของทุกช่องไว้ให้ safe_write"""
+    ws.merge_cells(rng_str)
+    rng = CellRange(rng_str)
+    top_left = (rng.min_row, rng.min_col)
+    index = _merged_index(ws)
+    for r in range(rng.min_row, rng.max_row + 1):
+        for c in range(rng.min_col, rng.max_col + 1):
+            index[(r, c)] = top_left
+
+
 def safe_unmerge_all(ws):
     # unmerge ทั้งหมดแบบไม่จำกัดช่วง กัน template แปลกๆ
     for rng in list(ws.merged_cells.ranges):
         ws.unmerge_cells(str(rng))
+    _merged_index(ws).clear()
+
+
+def _set_dimension(dims, dim_cls, ws, key, **attrs):
+    """
+    ตั้งความกว้าง/สูงของแถว-คอลัมน์ ถ้า template มี dimension อยู่แล้วแก้ตัวเดิม
+    ถ้าไม่มีสร้างใหม่ทีเดียว (ไม่ผ่าน defaultdict + setter)
+    """
+    dim = dims.get(key)
+    if dim is None:
+        dims[key] = dim_cls(ws, index=key, **attrs)
+    else:
+        for name, value in attrs.items():
+            setattr(dim, name, value)
 
 
 def _apply_outline(ws, start_row, end_row, start_col, end_col, thin: Side, thick: Side):
+    # มีแค่ไม่กี่แบบ (มุม/ขอบ/ข้างใน) -> สร้าง Border ครั้งเดียวต่อแบบ
+    borders = {}
     for r in range(start_row, end_row + 1):
         for c in range(start_col, end_col + 1):
-            cell = ws.cell(row=r, column=c)
-            cell.border = Border(
-                left=thick if c == start_col else thin,
-                right=thick if c == end_col else thin,
-                top=thick if r == start_row else thin,
-                bottom=thick if r == end_row else thin,
-            )
+            key = (c == start_col, c == end_col, r == start_row, r == end_row)
+            border = borders.get(key)
+            if border is None:
+                left, right, top, bottom = key
+                border = borders[key] = Border(
+                    left=thick if left else thin,
+                    right=thick if right else thin,
+                    top=thick if top else thin,
+                    bottom=thick if bottom else thin,
+                )
+            ws.cell(row=r, column=c).border = border
+
+
+@lru_cache(maxsize=8)
+def _template_bytes(template_path: str, mtime: float) -> bytes:
+    """
+    อ่านไฟล์ template จาก disk แค่ครั้งเดียว (cache ตาม mtime)
+    ออกรายงานหลายคัน (ZIP) จะเปิด workbook จาก bytes ใน memory แทน
+    """
+    with open(template_path, "rb") as f:
+        return f.read()
+
+
+def save_workbook_fast(wb) -> BytesIO:
+    """
+    เหมือน wb.save(bio) แต่บีบอัด zip ที่ ZIP_LEVEL
+    (openpyxl เปิด ZipFile เองโดยไม่ให้กำหนดระดับ)
+    """
+    if wb.write_only and not wb.worksheets:
+        wb.create_sheet()
+    wb.properties.modified = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+    bio = BytesIO()
+    archive = ZipFile(bio, "w", ZIP_DEFLATED, allowZip64=True, compresslevel=ZIP_LEVEL)
+    ExcelWriter(wb, archive).save()  # save() ปิด archive ให้เอง
+    bio.seek(0)
+    return bio
 
 
 def _apply_a4_one_page(ws, *, last_row: int):
@@ -91,8 +258,9 @@ def _apply_a4_one_page(ws, *, last_row: int):
     - Center แนวนอน (ช่วยให้บาลานซ์)
     - Print area: A1:H{last_row}
     """
-    ws.page_setup.paperSize = ws.PAPERSIZE_A4
-    ws.page_setup.orientation = ws.ORIENTATION_PORTRAIT
+    # ค่าคงที่อ่านจาก class (WriteOnlyWorksheet ไม่มี attribute พวกนี้)
+    ws.page_setup.paperSize = Worksheet.PAPERSIZE_A4
+    ws.page_setup.orientation = Worksheet.ORIENTATION_PORTRAIT
 
     # สำคัญ: ให้ FitToPage ทำงานจริง
     ws.page_setup.fitToPage = True
@@ -133,11 +301,46 @@ def build_fuel_excel(
     note_line1: str = "ใช้เป็นรถประจำ  กดส.1  และใช้ในราชการเท่านั้น",
     note_line2: str = "(ไม่ได้ใช้เป็นรถประจำตำแหน่ง)",
 ):
+    # settings.FUEL_XLSX_BACKEND = "xlsxwriter" -> เขียนไฟล์ด้วย xlsxwriter (เร็วกว่ามาก)
+    # "openpyxl_writeonly" -> openpyxl แบบ write-only (ไม่ต้องมี xlsxwriter, ไม่ถือ Cell ไว้ในหน่วยความจำ)
+    # ถ้าไม่ได้ตั้ง หรือเครื่องไม่มี xlsxwriter ก็ใช้ openpyxl แบบเดิม
+    backend = getattr(settings, "FUEL_XLSX_BACKEND", "openpyxl")
+    writer = None
+    if backend == "openpyxl_writeonly":
+        from ._xlsx_backend import build_fuel_excel_writeonly as writer
+    elif backend == "xlsxwriter":
+        from ._xlsx_backend import build_fuel_excel_xlsxwriter, xlsxwriter
+
+        if xlsxwriter is not None:
+            writer = build_fuel_excel_xlsxwriter
+    if writer is not None:
+        return writer(
+            template_path,
+            title_text,
+            meta_text,
+            odo_start,
+            refills,
+            max_rows=max_rows,
+            summary_row=summary_row,
+            user_role_label=user_role_label,
+            driver_name=driver_name,
+            controller_name=controller_name,
+            controller_position=controller_position,
+            note_line1=note_line1,
+            note_line2=note_line2,
+        )
+
     if refills is None:
         refills = []
 
-    wb = load_workbook(template_path)
+    wb = load_workbook(
+        BytesIO(_template_bytes(template_path, os.path.getmtime(template_path)))
+    )
     ws = wb.active
+    get = ws.cell  # get(row, column) ไม่ต้อง parse "A1" ทุกครั้ง
+
+    # ความสูงแถว: เก็บไว้ก่อน (แถวเดียวกันตั้งซ้ำได้) แล้วค่อยลง sheet ทีเดียวตอนท้าย
+    row_heights: dict[int, float] = {}
 
     # =========================================================
     # 0) กัน mergedcell จาก template (ชัวร์สุด: unmerge ทั้งหมดก่อน)
@@ -145,64 +348,54 @@ def build_fuel_excel(
     safe_unmerge_all(ws)
 
     # =========================================================
-    # 1) Styles
+    # 1) Styles (ใช้ค่าคงที่ระดับ module ด้านบน)
     # =========================================================
-    thin = Side(style="thin", color="000000")
-    thick = Side(style="medium", color="000000")
-    dotted = Side(style="dotted", color="000000")
-
-    border_thin = Border(left=thin, right=thin, top=thin, bottom=thin)
-    header_fill = PatternFill("solid", fgColor="EFEFEF")
-
-    align_center_wrap = Alignment(horizontal="center", vertical="center", wrap_text=True)
-    align_center = Alignment(horizontal="center", vertical="center")
-    align_left = Alignment(horizontal="left", vertical="center", wrap_text=True)
-    align_right = Alignment(horizontal="right", vertical="center")
-
     def dotted_underline(cell):
-        cell.border = Border(bottom=dotted)
+        cell.border = _BORDER_DOTTED_BOTTOM
 
     # =========================================================
     # 2) Header บนสุด
     # =========================================================
-    ws.merge_cells("A1:H1")
-    ws.merge_cells("A2:H2")
+    merge(ws, "A1:H1")
+    merge(ws, "A2:H2")
 
     c = safe_write(ws, "A1", title_text)
     _set_font(c, bold=True, size=16)
-    c.alignment = align_center
+    c.alignment = _ALIGN_CENTER
 
     c = safe_write(ws, "A2", meta_text)
     _set_font(c, bold=False, size=12)
-    c.alignment = align_center
+    c.alignment = _ALIGN_CENTER
 
-    ws.row_dimensions[1].height = 22
-    ws.row_dimensions[2].height = 18
+    row_heights[1] = 22
+    row_heights[2] = 18
 
     # =========================================================
     # 3) เลขไมล์ต้นเดือน/สิ้นเดือน
     # =========================================================
     c = safe_write(ws, CELL_ODO_L, "เลขไมล์ต้นเดือน")
     _set_font(c, bold=True, size=12)
-    c.alignment = align_left
+    c.alignment = _ALIGN_LEFT
 
+    odo_s_cell = ws[CELL_ODO_S]
     if odo_start is not None:
-        safe_write(ws, CELL_ODO_S, int(odo_start))
-    ws[CELL_ODO_S].number_format = "#,##0"
-    ws[CELL_ODO_S].alignment = align_center
-    ws[CELL_ODO_S].border = border_thin
-    _set_font(ws[CELL_ODO_S], bold=False, size=12)
+        odo_s_cell = safe_write(ws, CELL_ODO_S, int(odo_start))
+    odo_s_cell.number_format = "#,##0"
+    odo_s_cell.alignment = _ALIGN_CENTER
+    odo_s_cell.border = _BORDER_THIN
+    _set_font(odo_s_cell, bold=False, size=12)
 
     c = safe_write(ws, CELL_ODO_E, "เลขไมล์สิ้นเดือน")
     _set_font(c, bold=True, size=12)
-    c.alignment = align_right
+    c.alignment = _ALIGN_RIGHT
 
-    ws[CELL_ODO_EV].number_format = "#,##0"
-    ws[CELL_ODO_EV].alignment = align_center
-    ws[CELL_ODO_EV].border = border_thin
-    _set_font(ws[CELL_ODO_EV], bold=False, size=12)
+    odo_ev_cell = ws[CELL_ODO_EV]
+    odo_ev_cell.number_format = "#,##0"
+    odo_ev_cell.alignment = _ALIGN_CENTER
+    odo_ev_cell.border = _BORDER_THIN
+    _set_font(odo_ev_cell, bold=False, size=12)
 
-    ws.row_dimensions[3].height = 18
+    row_heights[3] = 18
 
     # =========================================================
     # 4) ✅ หัวตาราง 3 ชั้น (เหมือนรูป)
@@ -213,111 +406,135 @@ def build_fuel_excel(
     data_start_row = hdr3 + 1
 
     # เคลียร์พื้นที่หัวตาราง
+    header_sa = _style_array(
+        ws,
+        font=_font(True, 12),
+        border=_BORDER_THIN,
+        fill=_HEADER_FILL,
+        alignment=_ALIGN_CENTER_WRAP,
+    )
     for r in range(hdr1, hdr3 + 1):
-        ws.row_dimensions[r].height = 18
-        for col in COLS:
-            cell = ws[f"{col}{r}"]
+        row_heights[r] = 18
+        for ci in range(1, len(COLS) + 1):
+            cell = get(r, ci)
             cell.value = None
-            cell.border = border_thin
-            cell.fill = header_fill
-            _set_font(cell, bold=True, size=12)
-            cell.alignment = align_center_wrap
+            cell._style = copy(header_sa)
 
     # Merge โครงหัวตาราง
-    ws.merge_cells(f"A{hdr1}:A{hdr3}")
-    ws.merge_cells(f"B{hdr1}:B{hdr3}")
-    ws.merge_cells(f"G{hdr1}:G{hdr3}")
-    ws.merge_cells(f"H{hdr1}:H{hdr3}")
+    # A/B สูงแค่ hdr2 เพราะ hdr3 (A:F) เป็นแถว "เลขไมล์ต้นเดือน" ห้าม merge ทับกัน
+    merge(ws, f"A{hdr1}:A{hdr2}")
+    merge(ws, f"B{hdr1}:B{hdr2}")
+    merge(ws, f"G{hdr1}:G{hdr3}")
+    merge(ws, f"H{hdr1}:H{hdr3}")
 
-    ws.merge_cells(f"C{hdr1}:D{hdr1}")
-    ws.merge_cells(f"E{hdr1}:F{hdr1}")
+    merge(ws, f"C{hdr1}:D{hdr1}")
+    merge(ws, f"E{hdr1}:F{hdr1}")
 
-    ws.merge_cells(f"A{hdr3}:F{hdr3}")  # เลขไมล์ต้นเดือน
+    merge(ws, f"A{hdr3}:F{hdr3}")  # เลขไมล์ต้นเดือน
 
     # ใส่ข้อความ (safe_write ทุกจุด)
-    safe_write(ws, f"A{hdr1}", "วันที่\nเติมน้ำมัน")
-    safe_write(ws, f"B{hdr1}", "เลขที่ใบส่งจ่าย\nยพ.1")
-    safe_write(ws, f"C{hdr1}", "น้ำมันเชื้อเพลิงที่ใช้")
-    safe_write(ws, f"E{hdr1}", "น้ำมันหล่อลื่น")
-    safe_write(ws, f"G{hdr1}", "เลข กม.\nที่เติม")
-    safe_write(ws, f"H{hdr1}", "หมายเหตุ")
+    safe_write(ws, (hdr1, 1), "วันที่\nเติมน้ำมัน")
+    safe_write(ws, (hdr1, 2), "เลขที่ใบส่งจ่าย\nยพ.1")
+    safe_write(ws, (hdr1, 3), "น้ำมันเชื้อเพลิงที่ใช้")
+    safe_write(ws, (hdr1, 5), "น้ำมันหล่อลื่น")
+    safe_write(ws, (hdr1, 7), "เลข กม.\nที่เติม")
+    safe_write(ws, (hdr1, 8), "หมายเหตุ")
 
-    safe_write(ws, f"C{hdr2}", "จำนวนลิตร")
-    safe_write(ws, f"D{hdr2}", "จำนวนเงิน")
-    safe_write(ws, f"E{hdr2}", "จำนวนลิตร")
-    safe_write(ws, f"F{hdr2}", "จำนวนเงิน")
+    safe_write(ws, (hdr2, 3), "จำนวนลิตร")
+    safe_write(ws, (hdr2, 4), "จำนวนเงิน")
+    safe_write(ws, (hdr2, 5), "จำนวนลิตร")
+    safe_write(ws, (hdr2, 6), "จำนวนเงิน")
 
-    safe_write(ws, f"A{hdr3}", "เลขไมล์ต้นเดือน")
+    safe_write(ws, (hdr3, 1), "เลขไมล์ต้นเดือน")
 
-    ws.row_dimensions[hdr1].height = 26
-    ws.row_dimensions[hdr2].height = 20
-    ws.row_dimensions[hdr3].height = 18
+    row_heights[hdr1] = 26
+    row_heights[hdr2] = 20
+    row_heights[hdr3] = 18
 
     # เส้นล่างหนาใต้ hdr2
-    for ccol in range(1, 9):
-        cell = ws.cell(row=hdr2, column=ccol)
-        cell.border = Border(left=thin, right=thin, top=thin, bottom=thick)
+    for ci in range(1, len(COLS) + 1):
+        get(hdr2, ci).border = _BORDER_HDR2
 
     # กรอบนอกหัวตารางหนา
-    _apply_outline(ws, hdr1, hdr3, 1, 8, thin, thick)
+    _apply_outline(ws, hdr1, hdr3, 1, 8, _THIN, _THICK)
 
     # =========================================================
     # 5) Table body (ล็อกจำนวนแถว)
     # =========================================================
     table_last_row = data_start_row + max_rows - 1
+    body_sa = _style_array(
+        ws, font=_font(False, 12), border=_BORDER_THIN, alignment=_ALIGN_BODY
+    )
     for r in range(data_start_row, table_last_row + 1):
-        ws.row_dimensions[r].height = 17
-        for col in COLS:
-            c = ws[f"{col}{r}"]
+        row_heights[r] = 17
+        for ci in range(1, len(COLS) + 1):
+            c = get(r, ci)
             c.value = None
-            c.border = border_thin
-            _set_font(c, bold=False, size=12)
-            c.alignment = Alignment(vertical="center", wrap_text=True)
+            c._style = copy(body_sa)
+
+    # style ของ cell ข้อมูลแต่ละแบบ (font + border + number_format + alignment) ทำครั้งเดียว
+    body_col_sa = {
+        key: _style_array(
+            ws,
+            font=_font(False, 12),
+            border=_BORDER_THIN,
+            number_format=number_format,
+            alignment=alignment,
+        )
+        for key, (number_format, alignment) in _BODY_STYLES.items()
+    }
 
     refills_list = list(refills)[:max_rows]
 
     last_odo: Optional[int] = None
-    for i, f in enumerate(refills_list):
-        r = data_start_row + i
-
-        refill_date = getattr(f, "refill_date", None)
-        bill_or_yp = getattr(f, "yp_number", "") or ""
-
-        fuel_liters = _to_float(getattr(f, "liters", None))
-        fuel_amount = _to_float(getattr(f, "total_price", None))
 
-        lube_liters = _to_float(getattr(f, "lube_liters", None))
-        lube_amount = _to_float(getattr(f, "lube_total_price", None))
-
-        odometer = getattr(f, "odometer", None)
-        remark = getattr(f, "remark", "") or ""
-
-        safe_write(ws, f"A{r}", refill_date)
-        safe_write(ws, f"B{r}", bill_or_yp)
-        safe_write(ws, f"C{r}", fuel_liters if fuel_liters is not None else None)
-        safe_write(ws, f"D{r}", fuel_amount if fuel_amount is not None else None)
-
-        safe_write(ws, f"E{r}", lube_liters if lube_liters is not None else "-")
-        safe_write(ws, f"F{r}", lube_amount if lube_amount is not None else "-")
-
-        safe_write(ws, f"G{r}", odometer)
-        safe_write(ws, f"H{r}", remark)
+    # ยอดรวมสะสมไปพร้อมกับตอนเขียนแถว (ไม่ต้องวนรอบสอง)
+    fuel_liters_sum = 0.0
+    fuel_money_sum = 0.0
+    lube_liters_sum = 0.0
+    lube_money_sum = 0.0
 
-        ws[f"A{r}"].number_format = "dd/mm/yyyy"
-        ws[f"C{r}"].number_format = "#,##0.000"
-        ws[f"D{r}"].number_format = "#,##0.00"
-        ws[f"E{r}"].number_format = "#,##0.000"
-        ws[f"F{r}"].number_format = "#,##0.00"
-        ws[f"G{r}"].number_format = "#,##0"
+    for i, f in enumerate(refills_list):
+        r = data_start_row + i
 
-        ws[f"A{r}"].alignment = align_center
-        ws[f"B{r}"].alignment = align_center
-        ws[f"C{r}"].alignment = align_right
-        ws[f"D{r}"].alignment = align_right
-        ws[f"E{r}"].alignment = align_center if ws[f"E{r}"].value == "-" else align_right
-        ws[f"F{r}"].alignment = align_center if ws[f"F{r}"].value == "-" else align_right
-        ws[f"G{r}"].alignment = align_right
-        ws[f"H{r}"].alignment = align_left
+        (
+            refill_date,
+            bill_or_yp,
+            fuel_liters,
+            fuel_amount,
+            lube_liters,
+            lube_amount,
+            odometer,
+            remark,
+        ) = _refill_values(f)
+        bill_or_yp = bill_or_yp or ""
+        remark = remark or ""
+
+        fuel_liters = _to_float(fuel_liters)
+        fuel_amount = _to_float(fuel_amount)
+        lube_liters = _to_float(lube_liters)
+        lube_amount = _to_float(lube_amount)
+
+        fuel_liters_sum += fuel_liters or 0.0
+        fuel_money_sum += fuel_amount or 0.0
+        if lube_liters is not None:
+            lube_liters_sum += lube_liters
+        if lube_amount is not None:
+            lube_money_sum += lube_amount
+
+        row = (
+            (refill_date, "date"),
+            (bill_or_yp, "text"),
+            (fuel_liters, "liters"),
+            (fuel_amount, "baht"),
+            (lube_liters, "liters") if lube_liters is not None else ("-", "liters_dash"),
+            (lube_amount, "baht") if lube_amount is not None else ("-", "baht_dash"),
+            (odometer, "km"),
+            (remark, "remark"),
+        )
+        for ci, (value, style) in enumerate(row, start=1):
+            c = safe_write(ws, (r, ci), value)
+            c._style = copy(body_col_sa[style])
 
         if odometer not in (None, ""):
             try:
@@ -326,40 +543,24 @@ def build_fuel_excel(
                 pass
 
     if last_odo is not None:
-        safe_write(ws, CELL_ODO_EV, last_odo)
+        odo_ev_cell = safe_write(ws, CELL_ODO_EV, last_odo)
 
     # =========================================================
     # 6) แถวรวมใต้ตาราง
     # =========================================================
     total_row = table_last_row + 1
-    ws.row_dimensions[total_row].height = 18
-    for col in COLS:
-        c = ws[f"{col}{total_row}"]
-        c.border = border_thin
+    row_heights[total_row] = 18
+    for ci in range(1, len(COLS) + 1):
+        c = get(total_row, ci)
+        c.border = _BORDER_THIN
         _set_font(c, bold=False, size=12)
-        c.alignment = align_center
+        c.alignment = _ALIGN_CENTER
 
     # =========================================================
     # 7) คำนวณ “ตัวเลขจริง”
     # =========================================================
-    fuel_liters_sum = 0.0
-    fuel_money_sum = 0.0
-    lube_liters_sum = 0.0
-    lube_money_sum = 0.0
-
-    for f in refills_list:
-        fuel_liters_sum += _to_float(getattr(f, "liters", 0)) or 0.0
-        fuel_money_sum += _to_float(getattr(f, "total_price", 0)) or 0.0
-
-        ll = _to_float(getattr(f, "lube_liters", None))
-        lm = _to_float(getattr(f, "lube_total_price", None))
-        if ll is not None:
-            lube_liters_sum += ll
-        if lm is not None:
-            lube_money_sum += lm
-
-    odo_end = _to_float(ws[CELL_ODO_EV].value)
-    odo_start_val = _to_float(ws[CELL_ODO_S].value)
+    odo_end = _to_float(odo_ev_cell.value)
+    odo_start_val = _to_float(odo_s_cell.value)
 
     distance = None
     if odo_end is not None and odo_start_val is not None:
@@ -369,21 +570,18 @@ def build_fuel_excel(
     if distance is not None and fuel_liters_sum > 0:
         avg_km_per_liter = distance / fuel_liters_sum
 
-    safe_write(ws, f"C{total_row}", fuel_liters_sum if fuel_liters_sum > 0 else None)
-    safe_write(ws, f"D{total_row}", fuel_money_sum if fuel_money_sum > 0 else None)
-    safe_write(ws, f"E{total_row}", lube_liters_sum if lube_liters_sum > 0 else None)
-    safe_write(ws, f"F{total_row}", lube_money_sum if lube_money_sum > 0 else None)
-    safe_write(ws, f"G{total_row}", last_odo if last_odo is not None else None)
-
-    ws[f"C{total_row}"].number_format = "#,##0.000"
-    ws[f"D{total_row}"].number_format = "#,##0.00"
-    ws[f"E{total_row}"].number_format = "#,##0.000"
-    ws[f"F{total_row}"].number_format = "#,##0.00"
-    ws[f"G{total_row}"].number_format = "#,##0"
-
-    for addr in [f"C{total_row}", f"D{total_row}", f"E{total_row}", f"F{total_row}", f"G{total_row}"]:
-        _set_font(ws[addr], bold=True, size=12)
-        ws[addr].alignment = align_right
+    totals = (
+        (3, fuel_liters_sum if fuel_liters_sum > 0 else None, "#,##0.000"),
+        (4, fuel_money_sum if fuel_money_sum > 0 else None, "#,##0.00"),
+        (5, lube_liters_sum if lube_liters_sum > 0 else None, "#,##0.000"),
+        (6, lube_money_sum if lube_money_sum > 0 else None, "#,##0.00"),
+        (7, last_odo if last_odo is not None else None, "#,##0"),
+    )
+    for ci, value, number_format in totals:
+        c = safe_write(ws, (total_row, ci), value)
+        c.number_format = number_format
+        _set_font(c, bold=True, size=12)
+        c.alignment = _ALIGN_RIGHT
 
     # =========================================================
     # 8) สรุปด้านล่าง (เส้นจุด)
@@ -394,133 +592,97 @@ def build_fuel_excel(
     r4 = r1 + 3
 
     for rr in (r1, r2, r3, r4):
-        ws.row_dimensions[rr].height = 18
+        row_heights[rr] = 18
 
     def dash_or_value(v: float):
         return "-" if v <= 0 else v
 
-    safe_write(ws, f"A{r1}", "น้ำมันเชื้อเพลิงรวม")
-    _set_font(ws[f"A{r1}"], bold=True)
-    safe_write(ws, f"C{r1}", dash_or_value(fuel_liters_sum))
-    ws[f"C{r1}"].number_format = "#,##0.000"
-    ws[f"C{r1}"].alignment = align_right
-    _set_font(ws[f"C{r1}"], bold=True)
-    dotted_underline(ws[f"C{r1}"])
-    safe_write(ws, f"D{r1}", "ลิตร")
-    safe_write(ws, f"E{r1}", "เป็นเงิน")
-    safe_write(ws, f"F{r1}", dash_or_value(fuel_money_sum))
-    ws[f"F{r1}"].number_format = "#,##0.00"
-    ws[f"F{r1}"].alignment = align_right
-    _set_font(ws[f"F{r1}"], bold=True)
-    dotted_underline(ws[f"F{r1}"])
-    safe_write(ws, f"G{r1}", "บาท")
-
-    safe_write(ws, f"A{r2}", "น้ำมันหล่อลื่นรวม")
-    _set_font(ws[f"A{r2}"], bold=True)
-    safe_write(ws, f"C{r2}", dash_or_value(lube_liters_sum))
-    ws[f"C{r2}"].number_format = "#,##0.000"
-    ws[f"C{r2}"].alignment = align_right
-    _set_font(ws[f"C{r2}"], bold=True)
-    dotted_underline(ws[f"C{r2}"])
-    safe_write(ws, f"D{r2}", "ลิตร")
-    safe_write(ws, f"E{r2}", "เป็นเงิน")
-    safe_write(ws, f"F{r2}", dash_or_value(lube_money_sum))
-    ws[f"F{r2}"].number_format = "#,##0.00"
-    ws[f"F{r2}"].alignment = align_right
-    _set_font(ws[f"F{r2}"], bold=True)
-    dotted_underline(ws[f"F{r2}"])
-    safe_write(ws, f"G{r2}", "บาท")
-
-    safe_write(ws, f"A{r3}", "ระยะทางการใช้รถยนต์ในรอบเดือน")
-    _set_font(ws[f"A{r3}"], bold=True)
-    safe_write(ws, f"C{r3}", distance if distance is not None else "")
-    ws[f"C{r3}"].number_format = "#,##0.00"
-    ws[f"C{r3}"].alignment = align_right
-    _set_font(ws[f"C{r3}"], bold=True)
-    dotted_underline(ws[f"C{r3}"])
-    safe_write(ws, f"D{r3}", "กม.")
-
-    safe_write(ws, f"A{r4}", "เฉลี่ยการใช้น้ำมันเชื้อเพลิง")
-    _set_font(ws[f"A{r4}"], bold=True)
-    safe_write(ws, f"C{r4}", avg_km_per_liter if avg_km_per_liter is not None else "")
-    ws[f"C{r4}"].number_format = "#,##0.00"
-    ws[f"C{r4}"].alignment = align_right
-    _set_font(ws[f"C{r4}"], bold=True)
-    dotted_underline(ws[f"C{r4}"])
-    safe_write(ws, f"D{r4}", "กม./ลิตร")
+    def summary_value(r: int, ci: int, value: Any, number_format: str):
+        c = safe_write(ws, (r, ci), value)
+        c.number_format = number_format
+        c.alignment = _ALIGN_RIGHT
+        _set_font(c, bold=True)
+        dotted_underline(c)
+
+    for rr, label, liters, money in (
+        (r1, "น้ำมันเชื้อเพลิงรวม", fuel_liters_sum, fuel_money_sum),
+        (r2, "น้ำมันหล่อลื่นรวม", lube_liters_sum, lube_money_sum),
+    ):
+        _set_font(safe_write(ws, (rr, 1), label), bold=True)
+        summary_value(rr, 3, dash_or_value(liters), "#,##0.000")
+        safe_write(ws, (rr, 4), "ลิตร")
+        safe_write(ws, (rr, 5), "เป็นเงิน")
+        summary_value(rr, 6, dash_or_value(money), "#,##0.00")
+        safe_write(ws, (rr, 7), "บาท")
+
+    _set_font(safe_write(ws, (r3, 1), "ระยะทางการใช้รถยนต์ในรอบเดือน"), bold=True)
+    summary_value(r3, 3, distance if distance is not None else "", "#,##0.00")
+    safe_write(ws, (r3, 4), "กม.")
+
+    _set_font(safe_write(ws, (r4, 1), "เฉลี่ยการใช้น้ำมันเชื้อเพลิง"), bold=True)
+    summary_value(r4, 3, avg_km_per_liter if avg_km_per_liter is not None else "", "#,##0.00")
+    safe_write(ws, (r4, 4), "กม./ลิตร")
 
     # =========================================================
     # 9) ลายเซ็น + หมายเหตุ
     # =========================================================
     sig_row = r4 + 2
-    ws.row_dimensions[sig_row].height = 18
-    ws.row_dimensions[sig_row + 1].height = 18
-
-    safe_write(ws, f"A{sig_row}", f"ลงชื่อ {user_role_label}")
-    ws[f"A{sig_row}"].alignment = align_left
-    _set_font(ws[f"A{sig_row}"], bold=False)
-
-    ws[f"B{sig_row}"].value = ""
-    ws[f"C{sig_row}"].value = ""
-    dotted_underline(ws[f"B{sig_row}"])
-    dotted_underline(ws[f"C{sig_row}"])
-    safe_write(ws, f"D{sig_row}", "(ผู้ใช้รถยนต์)")
-    _set_font(ws[f"D{sig_row}"], bold=False)
-
-    safe_write(ws, f"E{sig_row}", "ลงชื่อ")
-    _set_font(ws[f"E{sig_row}"], bold=False)
-
-    ws[f"F{sig_row}"].value = ""
-    ws[f"G{sig_row}"].value = ""
-    dotted_underline(ws[f"F{sig_row}"])
-    dotted_underline(ws[f"G{sig_row}"])
-    safe_write(ws, f"H{sig_row}", "(ผู้ควบคุมการใช้รถยนต์/พหน.)")
-    _set_font(ws[f"H{sig_row}"], bold=False)
+    row_heights[sig_row] = 18
+    row_heights[sig_row + 1] = 18
+
+    c = safe_write(ws, (sig_row, 1), f"ลงชื่อ {user_role_label}")
+    c.alignment = _ALIGN_LEFT
+    _set_font(c, bold=False)
+
+    for ci in (2, 3, 6, 7):
+        c = get(sig_row, ci)
+        c.value = ""
+        dotted_underline(c)
+
+    _set_font(safe_write(ws, (sig_row, 4), "(ผู้ใช้รถยนต์)"), bold=False)
+    _set_font(safe_write(ws, (sig_row, 5), "ลงชื่อ"), bold=False)
+    _set_font(safe_write(ws, (sig_row, 8), "(ผู้ควบคุมการใช้รถยนต์/พหน.)"), bold=False)
 
     name_row = sig_row + 1
-    ws.merge_cells(f"A{name_row}:D{name_row}")
-    ws.merge_cells(f"E{name_row}:H{name_row}")
-    safe_write(ws, f"A{name_row}", f"( {driver_name} )" if driver_name else "(                         )")
-    safe_write(
-        ws,
-        f"E{name_row}",
-        f"( {controller_name} )   {controller_position}" if controller_name else f"(                         )   {controller_position}",
+    merge(ws, f"A{name_row}:D{name_row}")
+    merge(ws, f"E{name_row}:H{name_row}")
+    names = (
+        (1, f"( {driver_name} )" if driver_name else "(                         )"),
+        (5, f"( {controller_name} )   {controller_position}" if controller_name else f"(                         )   {controller_position}"),
     )
-    ws[f"A{name_row}"].alignment = align_center
-    ws[f"E{name_row}"].alignment = align_center
-    _set_font(ws[f"A{name_row}"], bold=False)
-    _set_font(ws[f"E{name_row}"], bold=False)
+    for ci, text in names:
+        c = safe_write(ws, (name_row, ci), text)
+        c.alignment = _ALIGN_CENTER
+        _set_font(c, bold=False)
 
     note_row = name_row + 2
-    ws.row_dimensions[note_row].height = 18
-    ws.row_dimensions[note_row + 1].height = 18
-
-    safe_write(ws, f"A{note_row}", "หมายเหตุ:-")
-    _set_font(ws[f"A{note_row}"], bold=True)
-    ws[f"A{note_row}"].alignment = align_left
+    row_heights[note_row] = 18
+    row_heights[note_row + 1] = 18
 
-    ws.merge_cells(f"B{note_row}:H{note_row}")
-    safe_write(ws, f"B{note_row}", note_line1)
-    ws[f"B{note_row}"].alignment = align_left
-    _set_font(ws[f"B{note_row}"], bold=False)
+    c = safe_write(ws, (note_row, 1), "หมายเหตุ:-")
+    _set_font(c, bold=True)
+    c.alignment = _ALIGN_LEFT
 
-    ws.merge_cells(f"B{note_row + 1}:H{note_row + 1}")
-    safe_write(ws, f"B{note_row + 1}", note_line2)
-    ws[f"B{note_row + 1}"].alignment = align_left
-    _set_font(ws[f"B{note_row + 1}"], bold=False)
+    for rr, text in ((note_row, note_line1), (note_row + 1, note_line2)):
+        merge(ws, f"B{rr}:H{rr}")
+        c = safe_write(ws, (rr, 2), text)
+        c.alignment = _ALIGN_LEFT
+        _set_font(c, bold=False)
 
     # =========================================================
     # 10) กรอบตารางรวม
     # =========================================================
-    _apply_outline(ws, hdr1, total_row, 1, 8, thin, thick)
+    _apply_outline(ws, hdr1, total_row, 1, 8, _THIN, _THICK)
 
     # =========================================================
-    # 11) ความกว้างคอลัมน์ (ปรับให้ A4 พอดีขึ้น)
+    # 11) ความกว้างคอลัมน์ (ปรับให้ A4 พอดีขึ้น) + ความสูงแถว
     # =========================================================
     # เดิมค่อนข้างกว้าง ทำให้บางเครื่องพิมพ์ล้นขวาได้
-    widths = [10.5, 12, 12.5, 11.5, 12.5, 11.5, 11, 13.5]
-    for i, w in enumerate(widths, start=1):
-        ws.column_dimensions[get_column_letter(i)].width = w
+    for i, w in enumerate(COL_WIDTHS, start=1):
+        _set_dimension(ws.column_dimensions, ColumnDimension, ws, get_column_letter(i), width=w)
+
+    for r, h in row_heights.items():
+        _set_dimension(ws.row_dimensions, RowDimension, ws, r, ht=h)
 
     # =========================================================
     # 12) Page setup: A4 หน้าเดียว + Print area
@@ -528,7 +690,4 @@ def build_fuel_excel(
     last_row_for_print = note_row + 2
     _apply_a4_one_page(ws, last_row=last_row_for_print)
 
-    bio = BytesIO()
-    wb.save(bio)
-    bio.seek(0)
-    return bio
+    return save_workbook_fast(wb)
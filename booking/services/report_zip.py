@@ -0,0 +1,48 @@
+# booking/services/report_zip.py
+import io
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+
+class _ZipSink(io.RawIOBase):
+    """
+    ปลายทางของ ZipFile ที่ seek ไม่ได้ (zipfile จะเขียนแบบ data descriptor ต่อท้ายไฟล์)
+    เก็บ bytes ไว้จนกว่าจะถูก drain ออกไปส่งให้ client
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        chunks, self._chunks = self._chunks, []
+        return b"".join(chunks)
+
+
+def iter_zip(
+    entries: Iterable[Tuple[str, bytes]],
+    compression: int = zipfile.ZIP_DEFLATED,
+) -> Iterator[bytes]:
+    """
+    สร้างไฟล์ ZIP ทีละไฟล์ย่อยแล้ว yield bytes ออกไปเลย (ใช้กับ StreamingHttpResponse)
+    entries เป็น (ชื่อไฟล์ใน zip, ข้อมูล) ส่งมาเป็น generator ได้
+    หน่วยความจำจึงถือแค่ไฟล์ย่อยทีละไฟล์ ไม่ต้องเก็บทั้ง archive
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=compression) as zf:
+        for name, data in entries:
+            zf.writestr(name, data)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    # central directory ท้ายไฟล์ (เขียนตอนปิด ZipFile)
+    tail = sink.drain()
+    if tail:
+        yield tail
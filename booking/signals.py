@@ -0,0 +1,16 @@
+# booking/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Booking, FuelRefill
+from .utils.audit import invalidate_audit_cache
+
+
+# NOTE: queryset.update() / bulk_create() / bulk_update() ไม่ส่ง signal พวกนี้
+# โค้ดที่แก้ Booking/FuelRefill แบบ bulk ต้องเรียก invalidate_audit_cache() เองหลังเขียนเสร็จ
+# (ไม่งั้นหน้าตรวจรายเดือน/ตัวเลขสรุปจะเห็นค่าเก่าจาก cache จนหมดอายุ)
+@receiver([post_save, post_delete], sender=Booking)
+@receiver([post_save, post_delete], sender=FuelRefill)
+def _drop_audit_cache(sender, **kwargs):
+    # ทริป/เติมน้ำมันเปลี่ยน -> ผลตรวจรายเดือนที่ cache ไว้ใช้ไม่ได้แล้ว
+    invalidate_audit_cache()
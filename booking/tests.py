@@ -1,3 +1,252 @@
-from django.test import TestCase
+import os
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .forms import UserFuelRefillForm
+from .models import Booking, Car, FuelRefill
+from .services import _xlsx_backend
+from .services.report_fuel_excel import build_fuel_excel
+from .utils.audit import audit_month, invalidate_audit_cache
+
+
+def make_car(**kwargs) -> Car:
+    fields = {
+        "plate_prefix": "นค",
+        "plate_number": "3814",
+        "province_full": "ขอนแก่น",
+        "brand_name": "ISUZU",
+        "model_name": "D-MAX",
+    }
+    fields.update(kwargs)
+    return Car.objects.create(**fields)
+
+
+class UserFuelRefillFormTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.car = make_car()
+
+    def valid_data(self, **overrides):
+        data = {
+            "car_id": str(self.car.id),
+            "fuel_place": "ปตท. ขอนแก่น",
+            "yp_number": "ยพ.001",
+            "odometer": "12345",
+            "price_per_liter": "32.50",
+            "liters": "40",
+            "total_price": "1300.00",
+            "refill_date": "2025-03-15",
+        }
+        data.update(overrides)
+        return data
+
+    def test_valid_post(self):
+        form = UserFuelRefillForm(self.valid_data())
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["car_id"], self.car)
+        self.assertEqual(form.cleaned_data["refill_date"], date(2025, 3, 15))
+
+    def test_first_error_follows_field_order(self):
+        # ทุกช่องว่าง -> แจ้งเรื่องรถก่อน (ลำดับเดียวกับหน้าเดิม)
+        form = UserFuelRefillForm({})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.first_error(), "กรุณาเลือกทะเบียนรถ")
+
+        cases = [
+            ({"fuel_place": ""}, "กรุณากรอกสถานที่เติมน้ำมัน 697"),
+            ({"fuel_place": "", "odometer": "abc"}, "กรุณากรอกสถานที่เติมน้ำมัน 697"),
+            ({"yp_number": "", "odometer": ""}, "กรุณากรอกเลข ยพ."),
+            ({"odometer": ""}, "กรุณากรอกเลขไมล์"),
+            ({"odometer": "abc", "liters": "x"}, "เลขไมล์ต้องเป็นตัวเลข 711"),
+            ({"price_per_liter": "x", "total_price": ""}, "กรุณากรอกราคาน้ำมันต่อลิตรให้ถูกต้อง"),
+            ({"liters": "", "total_price": "x"}, "กรุณากรอกจำนวนลิตรให้ถูกต้อง"),
+            ({"total_price": "x"}, "กรุณากรอกราคารวมให้ถูกต้อง"),
+        ]
+        for overrides, message in cases:
+            with self.subTest(overrides=overrides):
+                form = UserFuelRefillForm(self.valid_data(**overrides))
+                self.assertFalse(form.is_valid())
+                self.assertEqual(form.first_error(), message)
+
+    def test_decimal_limits_have_thai_messages(self):
+        cases = [
+            ({"price_per_liter": "32.505"}, "ราคาน้ำมันต่อลิตรมีทศนิยมได้ไม่เกิน 2 ตำแหน่ง"),
+            ({"liters": "123456"}, "จำนวนลิตรต้องมีไม่เกิน 5 หลักก่อนจุดทศนิยม"),
+            ({"total_price": "1234567890"}, "ราคารวมต้องมีตัวเลขรวมไม่เกิน 9 หลัก"),
+        ]
+        for overrides, message in cases:
+            with self.subTest(overrides=overrides):
+                form = UserFuelRefillForm(self.valid_data(**overrides))
+                self.assertFalse(form.is_valid())
+                self.assertEqual(form.first_error(), message)
+
+    def test_empty_or_malformed_refill_date_becomes_today(self):
+        for raw in ("", "not-a-date", "2025-02-30", "15/03/2025"):
+            with self.subTest(refill_date=raw):
+                form = UserFuelRefillForm(self.valid_data(refill_date=raw))
+                self.assertTrue(form.is_valid(), form.errors)
+                self.assertEqual(form.cleaned_data["refill_date"], timezone.localdate())
+
+    def test_unknown_car_id(self):
+        form = UserFuelRefillForm(self.valid_data(car_id=str(self.car.id + 999)))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.first_error(), "กรุณาเลือกทะเบียนรถ")
+
+    def test_non_numeric_car_id(self):
+        form = UserFuelRefillForm(self.valid_data(car_id="abc"))
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.first_error(), "กรุณาเลือกทะเบียนรถ")
+
+
+FUEL_TEMPLATE = os.path.join(
+    settings.BASE_DIR, "booking", "report_templates", "fuel_report_template.xlsx"
+)
+
+
+def fake_refills(n: int) -> list:
+    return [
+        SimpleNamespace(
+            refill_date=date(2025, 3, i + 1),
+            yp_number=f"ยพ.{i:03d}",
+            liters=Decimal("40.500"),
+            total_price=Decimal("1300.25"),
+            lube_liters=Decimal("1.000") if i % 2 else None,
+            lube_total_price=Decimal("200.00") if i % 2 else None,
+            odometer=10000 + i * 150,
+            remark="ไปประชุม" if i == 1 else "",
+        )
+        for i in range(n)
+    ]
+
+
+def workbook_snapshot(bio) -> dict:
+    """ค่าที่ใช้เทียบผลของแต่ละ backend: ค่าใน cell / ช่วง merge / การตั้งค่าพิมพ์"""
+    ws = load_workbook(bio).active
+    ps = ws.page_setup
+    return {
+        "values": {
+            c.coordinate: c.value
+            for row in ws.iter_rows()
+            for c in row
+            if c.value is not None
+        },
+        "merges": sorted(str(r) for r in ws.merged_cells.ranges),
+        "print": {
+            "paper": ps.paperSize,
+            "orientation": ps.orientation,
+            # xlsxwriter ไม่เขียน attribute ที่เท่าค่า default ของ OOXML (=1)
+            "fit_width": ps.fitToWidth or 1,
+            "fit_height": ps.fitToHeight or 1,
+            "fit_to_page": ws.sheet_properties.pageSetUpPr.fitToPage,
+            "area": ws.print_area,
+            "centered": ws.print_options.horizontalCentered,
+        },
+    }
+
+
+class FuelExcelBackendTests(SimpleTestCase):
+    BACKENDS = ("openpyxl", "openpyxl_writeonly", "xlsxwriter")
+
+    def build(self, backend: str, n_refills: int) -> dict:
+        with override_settings(FUEL_XLSX_BACKEND=backend):
+            bio = build_fuel_excel(
+                FUEL_TEMPLATE,
+                "รายงานการใช้น้ำมัน ประจำเดือน 03/2025",
+                "เลขทะเบียนรถ นค 3814 ขอนแก่น",
+                10000 if n_refills else None,
+                fake_refills(n_refills),
+            )
+        return workbook_snapshot(bio)
+
+    def test_backends_build_the_same_workbook(self):
+        for n_refills in (0, 5):
+            expected = self.build("openpyxl", n_refills)
+            # กันเทียบ sheet ว่างกับ sheet ว่าง: แถวข้อมูลต้องลงจริง
+            yp_numbers = {r.yp_number for r in fake_refills(n_refills)}
+            self.assertLessEqual(yp_numbers, set(expected["values"].values()))
+            for backend in self.BACKENDS[1:]:
+                with self.subTest(backend=backend, refills=n_refills):
+                    self.assertEqual(self.build(backend, n_refills), expected)
+
+    def test_xlsxwriter_missing_falls_back_to_openpyxl(self):
+        expected = self.build("openpyxl", 5)
+        with mock.patch.object(_xlsx_backend, "xlsxwriter", None), mock.patch.object(
+            _xlsx_backend, "build_fuel_excel_xlsxwriter"
+        ) as xlsxwriter_builder:
+            self.assertEqual(self.build("xlsxwriter", 5), expected)
+        xlsxwriter_builder.assert_not_called()
+
+
+class AuditCacheInvalidationTests(TestCase):
+    start = date(2025, 3, 1)
+    end = date(2025, 3, 31)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.car = make_car()
+        cls.user = User.objects.create_user("emp001", password="x")
+
+    def setUp(self):
+        cache.clear()
+        self.booking = Booking.objects.create(
+            car=self.car,
+            requester=self.user,
+            start_date=date(2025, 3, 10),
+            end_date=date(2025, 3, 11),
+            destination="ขอนแก่น",
+            status="RETURNED",
+            odometer_before=1000,
+            odometer_after=1100,
+        )
+
+    def issue_types(self) -> list:
+        return [i["type"] for i in audit_month([self.car], self.start, self.end)[self.car.id]]
+
+    def test_result_is_cached(self):
+        self.assertEqual(self.issue_types(), [])
+        # รอบสองอ่านจาก cache ไม่ query
+        with self.assertNumQueries(0):
+            self.assertEqual(self.issue_types(), [])
+
+    def test_booking_save_invalidates(self):
+        self.assertEqual(self.issue_types(), [])
+        self.booking.odometer_after = 900
+        self.booking.save()
+        self.assertEqual(self.issue_types(), ["reversed_odometer"])
+
+    def test_booking_delete_invalidates(self):
+        self.booking.odometer_before = None
+        self.booking.save()
+        self.assertEqual(self.issue_types(), ["missing_before"])
+        self.booking.delete()
+        self.assertEqual(self.issue_types(), [])
+
+    def test_fuel_refill_save_and_delete_invalidate(self):
+        self.assertEqual(self.issue_types(), [])
+        refill = FuelRefill.objects.create(
+            car=self.car,
+            refill_date=date(2025, 3, 12),
+            liters=Decimal("10"),
+            total_price=Decimal("320"),
+            odometer=1150,
+        )
+        self.assertEqual(self.issue_types(), ["fuel_without_booking"])
+        refill.delete()
+        self.assertEqual(self.issue_types(), [])
+
+    def test_bulk_update_needs_explicit_invalidation(self):
+        self.assertEqual(self.issue_types(), [])
+        # update() ไม่ส่ง signal: ยังเห็นผลเก่าจาก cache
+        Booking.objects.filter(pk=self.booking.pk).update(odometer_after=900)
+        self.assertEqual(self.issue_types(), [])
+        invalidate_audit_cache()
+        self.assertEqual(self.issue_types(), ["reversed_odometer"])
@@ -1,10 +1,20 @@
 # booking/utils/audit.py
+from collections import defaultdict
 from datetime import date
 import calendar
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence
+
+from django.core.cache import cache
 
 from booking.models import Booking, FuelRefill, Car
 
+# ผลตรวจเก็บใน cache ได้นานเท่านี้ (วินาที)
+AUDIT_CACHE_TIMEOUT = 3600
+
+# เลขรุ่นของ cache ผลตรวจ: มีการแก้ Booking/FuelRefill เมื่อไร (ดู booking/signals.py)
+# ก็เพิ่มเลขนี้ key เก่าทั้งหมดจะไม่ถูกอ่านอีก (รอหมดอายุเอง)
+_AUDIT_GEN_KEY = "audit:gen"
+
 
 def month_range(year: int, month: int):
     """คืนค่าวันเริ่ม-วันสิ้นสุดของเดือนนั้น"""
@@ -12,66 +22,192 @@ def month_range(year: int, month: int):
     return date(year, month, 1), date(year, month, last)
 
 
+def invalidate_audit_cache() -> None:
+    """ทิ้งผลตรวจที่ cache ไว้ทั้งหมด (เรียกเมื่อข้อมูลทริป/เติมน้ำมันเปลี่ยน)"""
+    try:
+        cache.incr(_AUDIT_GEN_KEY)
+    except ValueError:
+        cache.set(_AUDIT_GEN_KEY, 1, None)
+
+
+def booking_data_cache_key(*parts: Any) -> str:
+    """
+    key ของ cache ที่คำนวณจากข้อมูลทริป/เติมน้ำมัน (เช่น ตัวเลขสรุปหน้า admin)
+    ผูกกับเลขรุ่นเดียวกับผลตรวจ จึงถูกทิ้งพร้อมกันเมื่อ Booking/FuelRefill เปลี่ยน
+    """
+    gen = cache.get_or_set(_AUDIT_GEN_KEY, 0, None)
+    return ":".join(["booking", str(gen), *map(str, parts)])
+
+
+def _audit_cache_keys(
+    car_ids: Iterable[int], start: date, end: date, gap_threshold_km: int
+) -> Dict[int, str]:
+    gen = cache.get_or_set(_AUDIT_GEN_KEY, 0, None)
+    return {
+        car_id: f"audit:{gen}:{car_id}:{start}:{end}:{gap_threshold_km}"
+        for car_id in car_ids
+    }
+
+
+def audit_month(
+    cars: Iterable[Car],
+    start: date,
+    end: date,
+    gap_threshold_km: int = 200,
+) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    ตรวจความผิดปกติของหลายคันในเดือนเดียว
+    query ทริป/เติมน้ำมันของทุกคันรวมแค่ 2 ครั้ง แล้วแยกตาม car_id ใน Python
+    คืนค่า {car_id: [issue, ...]} (ทุกคันที่ส่งเข้ามามี key เสมอ)
+    ผลของแต่ละคันเก็บ cache ไว้ ครั้งต่อไป query เฉพาะคันที่ยังไม่มีใน cache
+    """
+    keys = _audit_cache_keys([c.id for c in cars], start, end, gap_threshold_km)
+    cached = cache.get_many(keys.values())
+    result = {car_id: cached[key] for car_id, key in keys.items() if key in cached}
+    car_ids = [car_id for car_id in keys if car_id not in result]
+    if not car_ids:
+        return result
+
+    trips_by_car: Dict[int, List[Booking]] = defaultdict(list)
+    for b in Booking.objects.filter(
+        car_id__in=car_ids, start_date__lte=end, end_date__gte=start
+    ).order_by("car_id", "start_date", "id"):
+        trips_by_car[b.car_id].append(b)
+
+    fuels_by_car: Dict[int, List[FuelRefill]] = defaultdict(list)
+    for f in FuelRefill.objects.filter(
+        car_id__in=car_ids, refill_date__range=(start, end)
+    ).select_related("booking").order_by("car_id", "refill_date", "id"):
+        fuels_by_car[f.car_id].append(f)
+
+    fresh = {
+        car_id: _audit_car(
+            car_id, trips_by_car[car_id], fuels_by_car[car_id], gap_threshold_km
+        )
+        for car_id in car_ids
+    }
+    cache.set_many(
+        {keys[car_id]: issues for car_id, issues in fresh.items()},
+        AUDIT_CACHE_TIMEOUT,
+    )
+    result.update(fresh)
+    return {car_id: result[car_id] for car_id in keys}
+
+
 def audit_car_month(
-    car: Car, start: date, end: date, gap_threshold_km: int = 200
+    car: Car,
+    start: date,
+    end: date,
+    gap_threshold_km: int = 200,
+    *,
+    bookings: Optional[Iterable[Booking]] = None,
+    refills: Optional[Iterable[FuelRefill]] = None,
 ) -> List[Dict[str, Any]]:
     """
     ตรวจความผิดปกติของ 1 รถ ในช่วงเดือนที่กำหนด
     คืนค่า list ของ issue dict เพื่อเอาไปแสดงหน้าเว็บ/พิมพ์ใน terminal ได้
+
+    ถ้าผู้เรียก prefetch ข้อมูลของเดือนมาแล้ว ส่ง bookings/refills (เรียงตามวันที่)
+    เข้ามาได้เลย จะไม่ query ซ้ำ (ตรวจหลายคันพร้อมกันใช้ audit_month)
+    ถ้าไม่ได้ส่งข้อมูลมา จะใช้/เก็บผลใน cache แบบเดียวกับ audit_month
     """
-    issues: List[Dict[str, Any]] = []
+    if bookings is None and refills is None:
+        return audit_month([car], start, end, gap_threshold_km)[car.id]
 
     # ทริปที่ “ทับช่วงเดือน”
-    trips = list(
-        Booking.objects.filter(
+    if bookings is None:
+        bookings = Booking.objects.filter(
             car=car, start_date__lte=end, end_date__gte=start
         ).order_by("start_date", "id")
-    )
 
     # เติมน้ำมันในเดือน
-    fuels = list(
-        FuelRefill.objects.filter(car=car, refill_date__range=(start, end)).order_by(
-            "refill_date", "id"
-        )
+    if refills is None:
+        refills = FuelRefill.objects.filter(
+            car=car, refill_date__range=(start, end)
+        ).select_related("booking").order_by("refill_date", "id")
+
+    return _audit_car(car.id, list(bookings), list(refills), gap_threshold_km)
+
+
+def _audit_car(
+    car_id: int,
+    trips: Sequence[Booking],
+    fuels: Sequence[FuelRefill],
+    gap_threshold_km: int,
+) -> List[Dict[str, Any]]:
+    """ตรวจ 1 คัน จากรายการทริป/เติมน้ำมันที่ดึงมาแล้ว (เรียงตามวันที่)"""
+    return list(_iter_car_issues(car_id, trips, fuels, gap_threshold_km))
+
+
+# ข้อความของแต่ละ issue (ประกอบตอนจะแสดงผลเท่านั้น ดู format_issue)
+_MESSAGES = {
+    "missing_before": "ขาดเลขไมล์ก่อนใช้งาน (การจอง #{booking_id})",
+    "missing_after": "ขาดเลขไมล์หลังใช้งาน (การจอง #{booking_id})",
+    "reversed_odometer": "เลขไมล์ถอยหลัง: before={before}, after={after} (การจอง #{booking_id})",
+    "gap_negative": "ต่อเนื่องเลขไมล์ผิด: after ของการจอง #{prev_id} > before ของการจอง #{booking_id} (gap={gap})",
+    "gap_between_trips": "พบช่องว่างระยะทาง {gap} กม. ระหว่างการจอง #{prev_id} -> #{booking_id}",
+    "fuel_below_trip": "เลขไมล์ตอนเติม ({odometer}) < เลขไมล์ก่อนใช้งาน ({trip_odometer}) ของการจอง #{booking_id}",
+    "fuel_above_trip": "เลขไมล์ตอนเติม ({odometer}) > เลขไมล์หลังใช้งาน ({trip_odometer}) ของการจอง #{booking_id}",
+    "fuel_without_booking": "เติมน้ำมันวันที่ {refill_date} แต่ไม่ได้ผูกกับการจอง (yp_number={yp_number})",
+}
+
+
+def format_issue(issue: Dict[str, Any]) -> str:
+    """ข้อความภาษาไทยของ issue 1 รายการ (สำหรับแสดงหน้าเว็บ/พิมพ์ใน terminal)"""
+    return _MESSAGES[issue["message_key"]].format(
+        booking_id=issue["booking_id"], **issue["message_args"]
     )
 
+
+def _issue(
+    type_: str,
+    car_id: int,
+    booking_id: Optional[int],
+    fuel_id: Optional[int],
+    date_range: str,
+    message_key: Optional[str] = None,
+    **message_args: Any,
+) -> Dict[str, Any]:
+    return {
+        "type": type_,
+        "car_id": car_id,
+        "booking_id": booking_id,
+        "fuel_id": fuel_id,
+        "date_range": date_range,
+        "message_key": message_key or type_,
+        "message_args": message_args,
+    }
+
+
+def _iter_car_issues(
+    car_id: int,
+    trips: Sequence[Booking],
+    fuels: Sequence[FuelRefill],
+    gap_threshold_km: int,
+) -> Iterator[Dict[str, Any]]:
+    """
+    ไล่ issue ของ 1 คันทีละรายการ (generator)
+    ยังไม่สร้างข้อความ เก็บแค่ค่าที่ต้องใช้ไว้ใน message_args
+    """
     # 1) ตรวจ missing + reversed ในแต่ละทริป
     for b in trips:
+        trip_range = f"{b.start_date}..{b.end_date}"
         if b.odometer_before is None:
-            issues.append(
-                {
-                    "type": "missing_before",
-                    "car_id": car.id,
-                    "booking_id": b.id,
-                    "fuel_id": None,
-                    "date_range": f"{b.start_date}..{b.end_date}",
-                    "message": f"ขาดเลขไมล์ก่อนใช้งาน (ยพ. {b.yp_number})",
-                }
-            )
+            yield _issue("missing_before", car_id, b.id, None, trip_range)
 
         if b.odometer_after is None:
-            issues.append(
-                {
-                    "type": "missing_after",
-                    "car_id": car.id,
-                    "booking_id": b.id,
-                    "fuel_id": None,
-                    "date_range": f"{b.start_date}..{b.end_date}",
-                    "message": f"ขาดเลขไมล์หลังใช้งาน (ยพ. {b.yp_number})",
-                }
-            )
+            yield _issue("missing_after", car_id, b.id, None, trip_range)
 
         if b.odometer_before is not None and b.odometer_after is not None:
             if b.odometer_after < b.odometer_before:
-                issues.append(
-                    {
-                        "type": "reversed_odometer",
-                        "car_id": car.id,
-                        "booking_id": b.id,
-                        "fuel_id": None,
-                        "date_range": f"{b.start_date}..{b.end_date}",
-                        "message": f"เลขไมล์ถอยหลัง: before={b.odometer_before}, after={b.odometer_after} (ยพ. {b.yp_number})",
-                    }
+                yield _issue(
+                    "reversed_odometer",
+                    car_id,
+                    b.id,
+                    None,
+                    trip_range,
+                    before=b.odometer_before,
+                    after=b.odometer_after,
                 )
 
     # 2) ตรวจช่องว่างระยะทาง (gap) ระหว่างทริป
@@ -81,29 +217,22 @@ def audit_car_month(
         if a.odometer_after is not None and b.odometer_before is not None:
             gap = b.odometer_before - a.odometer_after
             if gap < 0:
-                issues.append(
-                    {
-                        "type": "gap_negative",
-                        "car_id": car.id,
-                        "booking_id": b.id,
-                        "fuel_id": None,
-                        "date_range": f"{a.end_date} -> {b.start_date}",
-                        "message": f"ต่อเนื่องเลขไมล์ผิด: after ของยพ.{a.yp_number} > before ของยพ.{b.yp_number} (gap={gap})",
-                    }
-                )
+                kind = "gap_negative"
             elif gap > gap_threshold_km:
-                issues.append(
-                    {
-                        "type": "gap_between_trips",
-                        "car_id": car.id,
-                        "booking_id": b.id,
-                        "fuel_id": None,
-                        "date_range": f"{a.end_date} -> {b.start_date}",
-                        "message": f"พบช่องว่างระยะทาง {gap} กม. ระหว่างยพ. {a.yp_number} -> {b.yp_number}",
-                    }
-                )
+                kind = "gap_between_trips"
+            else:
+                continue
+            yield _issue(
+                kind,
+                car_id,
+                b.id,
+                None,
+                f"{a.end_date} -> {b.start_date}",
+                prev_id=a.id,
+                gap=gap,
+            )
 
-    # 3) ตรวจเติมน้ำมันกับทริปที่ผูก
+    # 3) ตรวจเติมน้ำมันกับทริปที่ผูก (f.booking ควรมาจาก select_related แล้ว)
     for f in fuels:
         if f.booking_id:
             bk = f.booking
@@ -112,37 +241,34 @@ def audit_car_month(
                 and bk.odometer_before is not None
                 and f.odometer < bk.odometer_before
             ):
-                issues.append(
-                    {
-                        "type": "fuel_odometer_outside_trip",
-                        "car_id": car.id,
-                        "booking_id": bk.id,
-                        "fuel_id": f.id,
-                        "date_range": f"{f.refill_date}",
-                        "message": f"เลขไมล์ตอนเติม ({f.odometer}) < เลขไมล์ก่อนใช้งาน ({bk.odometer_before}) ของยพ.{bk.yp_number}",
-                    }
+                yield _issue(
+                    "fuel_odometer_outside_trip",
+                    car_id,
+                    bk.id,
+                    f.id,
+                    f"{f.refill_date}",
+                    "fuel_below_trip",
+                    odometer=f.odometer,
+                    trip_odometer=bk.odometer_before,
                 )
             if bk and bk.odometer_after is not None and f.odometer > bk.odometer_after:
-                issues.append(
-                    {
-                        "type": "fuel_odometer_outside_trip",
-                        "car_id": car.id,
-                        "booking_id": bk.id,
-                        "fuel_id": f.id,
-                        "date_range": f"{f.refill_date}",
-                        "message": f"เลขไมล์ตอนเติม ({f.odometer}) > เลขไมล์หลังใช้งาน ({bk.odometer_after}) ของยพ.{bk.yp_number}",
-                    }
+                yield _issue(
+                    "fuel_odometer_outside_trip",
+                    car_id,
+                    bk.id,
+                    f.id,
+                    f"{f.refill_date}",
+                    "fuel_above_trip",
+                    odometer=f.odometer,
+                    trip_odometer=bk.odometer_after,
                 )
         else:
-            issues.append(
-                {
-                    "type": "fuel_without_booking",
-                    "car_id": car.id,
-                    "booking_id": None,
-                    "fuel_id": f.id,
-                    "date_range": f"{f.refill_date}",
-                    "message": f"เติมน้ำมันวันที่ {f.refill_date} แต่ไม่ได้ผูกกับการจอง (yp_number={f.yp_number or '-'})",
-                }
+            yield _issue(
+                "fuel_without_booking",
+                car_id,
+                None,
+                f.id,
+                f"{f.refill_date}",
+                refill_date=f.refill_date,
+                yp_number=f.yp_number or "-",
             )
-
-    return issues
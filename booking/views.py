@@ -9,10 +9,10 @@ from __future__ import annotations
 # -----------------------------
 import os
 import calendar
-import zipfile
-from datetime import date, timedelta
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache, wraps
 from decimal import Decimal, InvalidOperation
-from io import BytesIO
 
 # -----------------------------
 # Django
@@ -22,13 +22,38 @@ from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
-from django.db.models import Q
-from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, transaction
+from django.db.models import (
+    BooleanField,
+    Case,
+    CharField,
+    Count,
+    Exists,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Concat, Greatest, NullIf, Trim
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
 from django.utils.dateparse import parse_date
 from django.views.decorators.http import require_POST
-from django.db.models import Case, When, Value, IntegerField
 
 import booking
 import json
@@ -36,41 +61,127 @@ import json
 # -----------------------------
 # Local
 # -----------------------------
-from .forms import EmployeeCreateForm, EmployeeUpdateForm, CarForm, FuelRefillForm
+from .forms import (
+    EmployeeCreateForm,
+    EmployeeUpdateForm,
+    CarForm,
+    FuelRefillForm,
+    UserFuelRefillForm,
+)
 from .models import Booking, Car, FuelRefill, Profile
 from .services.report_fuel_excel import build_fuel_excel
 from .services.report_car_docx import build_car_docx
+from .services.report_zip import iter_zip
+from .utils.audit import booking_data_cache_key
 from urllib.parse import quote
 
 # =============================================================================
 # Helpers
 # =============================================================================
 
+# จำนวนรายการสูงสุดใน dropdown หน้าเริ่มใช้งาน/คืนรถ
+RETURN_CAR_CHOICES_LIMIT = 50
+
+# เลขไมล์ยาวได้ไม่เกินนี้ (ให้อยู่ในช่วงของ PositiveIntegerField)
+ODOMETER_MAX_DIGITS = 9
+
+# จำนวนแถวต่อหน้าในรายการพนักงาน/รถของ admin
+ADMIN_LIST_PAGE_SIZE = 50
+
+# จำนวนแถวสูงสุดต่อตารางในหน้าตรวจข้อมูลรายเดือน
+AUDIT_ROWS_LIMIT = 300
+
+# ตัวเลขสรุปรายเดือนเก็บ cache ได้นานเท่านี้ (วินาที)
+# แก้ข้อมูลแล้ว signal ทิ้ง cache ให้ทันที ค่านี้กันกรณีรันหลาย process (LocMemCache แยกกัน)
+REPORT_COUNTS_CACHE_TIMEOUT = 60
+
+# ปุ่มกรองสถานะหน้า admin_booking_list -> เงื่อนไข filter เพิ่มเติม
+BOOKING_LIST_STATUS_FILTERS = {
+    "all": {},  # รวมทุกสถานะในเดือน
+    "book": {"status__in": Booking.ACTIVE_STATUSES},
+    "return": {"status": "RETURNED"},
+}
+
+# ชื่อเดือนภาษาไทย (index ตรงกับเลขเดือน 1-12)
+TH_MONTHS = (
+    "",
+    "มกราคม",
+    "กุมภาพันธ์",
+    "มีนาคม",
+    "เมษายน",
+    "พฤษภาคม",
+    "มิถุนายน",
+    "กรกฎาคม",
+    "สิงหาคม",
+    "กันยายน",
+    "ตุลาคม",
+    "พฤศจิกายน",
+    "ธันวาคม",
+)
+
+# ตัวเลือกเดือนใน dropdown กรองรายเดือน
+MONTH_OPTIONS = tuple(
+    {"value": i, "label": label} for i, label in enumerate(TH_MONTHS) if i
+)
+
+# คอลัมน์ที่ตารางการจองฝั่ง admin ใช้แสดง (ทะเบียนรถ / ผู้ขอ / ช่วงวัน / สถานะ)
+BOOKING_ROW_FIELDS = (
+    "id",
+    "status",
+    "start_date",
+    "end_date",
+    "car__plate_prefix",
+    "car__plate_number",
+    "car__province_full",
+    "requester__username",
+    "requester__first_name",
+    "requester__last_name",
+)
+
+
+_NO_CACHE = object()
+
 
 def get_profile(user: User) -> Profile | None:
+    """
+    profile ของ user (ไม่มี -> None)
+    จำผลไว้บน object user เลย request เดียวกันเรียกซ้ำได้ไม่ query ใหม่
+    (Django cache เฉพาะกรณีเจอ ถ้าไม่มี profile จะ query ทุกครั้ง)
+    """
+    cached = getattr(user, "_cached_profile", _NO_CACHE)
+    if cached is not _NO_CACHE:
+        return cached
     try:
-        return user.profile
+        profile = user.profile
     except Exception:
-        return None
+        profile = None
+    user._cached_profile = profile
+    return profile
 
 
 def is_admin(user: User) -> bool:
+    # staff/superuser รู้จาก object user อยู่แล้ว ไม่ต้องดึง profile
+    if user.is_staff or user.is_superuser:
+        return True
     p = get_profile(user)
-    return bool(p and p.role == "ADM") or user.is_staff or user.is_superuser
+    return bool(p and p.role == "ADM")
 
 
 def admin_required(view_func):
+    @wraps(view_func)
     def _wrapped(request, *args, **kwargs):
+        # ถ้าเรียกมาจาก fetch/ajax ให้คืน JSON (เช็ก header ครั้งเดียว)
+        is_ajax = request.headers.get("X-Requested-With") == "XMLHttpRequest"
+
         # ยังไม่ได้ login
         if not request.user.is_authenticated:
-            # ถ้าเรียกมาจาก fetch/ajax ให้คืน JSON
-            if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            if is_ajax:
                 return JsonResponse({"error": "not_authenticated"}, status=401)
             return redirect("booking:login")
 
         # login แล้ว แต่ไม่ใช่ admin
         if not is_admin(request.user):
-            if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+            if is_ajax:
                 return JsonResponse({"error": "forbidden"}, status=403)
             return HttpResponseForbidden("Forbidden")
 
@@ -83,13 +194,130 @@ def is_booking_member(booking: Booking, user: User) -> bool:
     """ผู้ที่ทำรายการคืนรถ/ดูรายการได้: ผู้สร้างคำขอ หรืออยู่ในผู้เดินทาง"""
     if booking.requester_id == user.id:
         return True
-    try:
-        prof = user.profile
-    except Exception:
+    prof = get_profile(user)
+    if prof is None:
         return False
+    # prefetch co_travelers มาแล้ว -> เช็กใน Python (.filter() จะ query ใหม่ทุกครั้ง)
+    if "co_travelers" in getattr(booking, "_prefetched_objects_cache", {}):
+        return any(p.id == prof.id for p in booking.co_travelers.all())
     return booking.co_travelers.filter(id=prof.id).exists()
 
 
+def member_of_booking_q(user: User) -> Q:
+    """
+    เงื่อนไข booking ที่ user เป็นผู้ขอ หรืออยู่ในผู้ร่วมเดินทาง
+    ผู้ร่วมเดินทางเช็กด้วย EXISTS บนตาราง M2M -> ไม่ต้อง JOIN แล้ว DISTINCT ทั้งแถว
+    """
+    co_traveler = Booking.co_travelers.through.objects.filter(
+        booking_id=OuterRef("pk"), profile__user=user
+    )
+    return Q(requester=user) | Q(Exists(co_traveler))
+
+
+def with_membership(qs, user: User):
+    """
+    เพิ่ม is_member (ผู้ขอ หรือผู้ร่วมเดินทาง) ให้ทุกแถวใน query เดียวกับที่ดึง booking
+    ไม่ต้องเช็กสิทธิ์แยกอีกรอบ
+    """
+    return qs.annotate(
+        is_member=ExpressionWrapper(
+            member_of_booking_q(user), output_field=BooleanField()
+        )
+    )
+
+
+def available_cars_between(start: date, end: date):
+    """
+    รถ READY ที่ไม่มี booking (BOOKED/IN_USE) ทับช่วง start..end
+    เช็กการทับด้วย NOT EXISTS ใน query เดียว ไม่ต้องดึง car_id ที่ไม่ว่างมาก่อน
+    """
+    conflict = Booking.objects.filter(
+        car_id=OuterRef("pk"),
+        status__in=Booking.ACTIVE_STATUSES,
+        start_date__lte=end,
+        end_date__gte=start,
+    )
+    return (
+        Car.objects.filter(status="READY")
+        .filter(~Exists(conflict))
+        .order_by("plate_prefix", "plate_number")
+    )
+
+
+def _bump_car_odometer(car_id: int, odometer: int, **fields) -> None:
+    """
+    ขยับเลขไมล์ปัจจุบันของรถขึ้นเป็น odometer (ไม่ลดลง) ด้วย UPDATE เดียว
+    ใช้ GREATEST ใน SQL ไม่ต้องโหลด Car มาเทียบก่อน
+    fields อื่นที่ส่งมา (เช่น status) จะถูกอัปเดตไปพร้อมกัน
+    """
+    Car.objects.filter(id=car_id).update(
+        current_odometer=Greatest(
+            Coalesce("current_odometer", Value(0)), Value(odometer)
+        ),
+        **fields,
+    )
+
+
+def _parse_odometer(raw: str | None) -> int | None:
+    """
+    เลขไมล์จากฟอร์ม (จำนวนเต็มไม่ติดลบ) ไม่ใช่ตัวเลข/ยาวเกิน -> None
+    เช็กด้วย isdecimal() ก่อน ไม่ต้องพึ่ง try/except int()
+    """
+    raw = (raw or "").strip()
+    if not raw.isdecimal() or len(raw) > ODOMETER_MAX_DIGITS:
+        return None
+    return int(raw)
+
+
+def _fuel_refill_redirect(booking_id: int | None = None):
+    """redirect ไปหน้าเติมน้ำมัน (ผูก booking_id ถ้ามี)"""
+    url = reverse("booking:user_fuel_refill")
+    if booking_id:
+        url = f"{url}?booking_id={booking_id}"
+    return redirect(url)
+
+
+def _employee_options() -> list[dict]:
+    """ตัวเลือกผู้ร่วมเดินทางในฟอร์มจอง: [{"id", "name"}] (ดึงแค่คอลัมน์ที่ใช้)"""
+    rows = Profile.objects.order_by(
+        "user__first_name", "user__last_name", "user__username"
+    ).values_list("id", "user__first_name", "user__last_name", "user__username")
+    return [
+        {"id": pk, "name": f"{first} {last}".strip() or username}
+        for pk, first, last, username in rows
+    ]
+
+
+def _dashboard_totals() -> dict:
+    """จำนวนรถ/ผู้ใช้ทั้งหมดบนหน้า admin dashboard: นับทั้งสองตารางใน query เดียว"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT (SELECT COUNT(*) FROM {}), (SELECT COUNT(*) FROM {})".format(
+                connection.ops.quote_name(Car._meta.db_table),
+                connection.ops.quote_name(User._meta.db_table),
+            )
+        )
+        total_cars, total_users = cursor.fetchone()
+    return {"total_cars": total_cars, "total_users": total_users}
+
+
+@lru_cache(maxsize=256)
+def _month_grid(year: int, month: int) -> tuple[tuple[date, ...], ...]:
+    """ตารางวันของเดือน (สัปดาห์ละ 7 วัน เริ่มวันจันทร์) ใช้ซ้ำได้ทุก request"""
+    weeks = calendar.Calendar(firstweekday=0).monthdatescalendar(year, month)
+    return tuple(tuple(week) for week in weeks)
+
+
+def _local_day_range(first_day: date, last_day: date) -> tuple[datetime, datetime]:
+    """
+    ช่วงเวลาครึ่งเปิด [first_day 00:00, วันถัดจาก last_day 00:00) ตามเวลาท้องถิ่น
+    ใช้แทน field__date__gte/lte (DATE(col) ทำให้ DB ใช้ index ของคอลัมน์ไม่ได้)
+    """
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min))
+    return start, end
+
+
 def safe_decimal(val: str | None) -> Decimal | None:
     if val is None:
         return None
@@ -155,17 +383,7 @@ def user_dashboard(request):
     today = timezone.localdate()
 
     # รถพร้อมให้จอง = status READY และ "ไม่ได้ถูกจอง/ใช้งานทับวันนี้"
-    busy_car_ids_today = (
-        Booking.objects.filter(status__in=["BOOKED", "IN_USE"])
-        .filter(start_date__lte=today, end_date__gte=today)
-        .values_list("car_id", flat=True)
-        .distinct()
-    )
-    available_cars = (
-        Car.objects.filter(status="READY")
-        .exclude(id__in=list(busy_car_ids_today))
-        .order_by("plate_prefix", "plate_number")
-    )
+    available_cars = available_cars_between(today, today)
 
     # ปฏิทิน/dropdown ต้องใช้รถทั้งหมด
     all_cars = Car.objects.all().order_by("plate_prefix", "plate_number")
@@ -173,27 +391,56 @@ def user_dashboard(request):
     # ปฏิทินในหน้า dashboard ใช้ all_bookings (ไม่เอา CANCELLED)
     # ปฏิทินในหน้า dashboard: เอาเฉพาะที่ยังจอง/กำลังใช้งาน
     all_bookings = (
-        Booking.objects.filter(status__in=["BOOKED", "IN_USE"])
-        .select_related("car", "requester")
-        .prefetch_related("co_travelers", "co_travelers__user")
+        Booking.objects.filter(status__in=Booking.ACTIVE_STATUSES)
+        # ปฏิทินอ่าน requester.profile ด้วย (ชื่อผู้ขอ) -> join มาใน query เดียว
+        .select_related("car", "requester__profile")
+        # เอาเฉพาะคอลัมน์ที่ปฏิทินใน dashboard ใช้
+        .only(
+            "id",
+            "start_date",
+            "end_date",
+            "destination",
+            "status",
+            "car__plate_prefix",
+            "car__plate_number",
+            "car__province_full",
+            "car__brand_name",
+            "car__model_name",
+            "car__color_code",
+            "requester__username",
+            "requester__first_name",
+            "requester__last_name",
+            "requester__profile__id",
+        )
+        .prefetch_related(
+            # ผู้ร่วมเดินทาง + user ใน query เดียว เอาแค่คอลัมน์ที่ใช้แสดงชื่อ
+            Prefetch(
+                "co_travelers",
+                queryset=Profile.objects.select_related("user").only(
+                    "id", "user__first_name", "user__last_name", "user__username"
+                ),
+                to_attr="co_travelers_list",
+            )
+        )
         .order_by("start_date")
     )
 
     # ตาราง "รายการจองของคุณ"
+    # ✅ สิทธิ์ยกเลิก: ยกเลิกได้ถึงนาทีสุดท้าย
+    # เงื่อนไขเดียว: ยังเป็น BOOKED (คำนวณใน SQL มาพร้อมแถวเลย)
     my_bookings = (
-        Booking.objects.filter(
-            Q(requester=request.user) | Q(co_travelers__user=request.user)
+        Booking.objects.filter(member_of_booking_q(request.user))
+        .select_related("car", "requester__profile")
+        .annotate(
+            can_cancel=Case(
+                When(status="BOOKED", then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            )
         )
-        .distinct()
-        .select_related("car", "requester")
         .order_by("-start_date", "-created_at")
     )
 
-    # ✅ สิทธิ์ยกเลิก: ยกเลิกได้ถึงนาทีสุดท้าย
-    # เงื่อนไขเดียว: ยังเป็น BOOKED
-    for b in my_bookings:
-        b.can_cancel = (b.status == "BOOKED")
-
     return render(
         request,
         "booking/user_dashboard.html",
@@ -217,30 +464,46 @@ def user_calendar(request):
     month = int(request.GET.get("month") or today.month)
     car_id = request.GET.get("car_id") or ""
 
-    cal = calendar.Calendar(firstweekday=0)
-    month_days = cal.monthdatescalendar(year, month)
+    month_days = _month_grid(year, month)
 
     first_day = date(year, month, 1)
     last_day = date(year, month, calendar.monthrange(year, month)[1])
 
     qs = (
-        Booking.objects.filter(status__in=["BOOKED", "IN_USE"])
+        Booking.objects.filter(status__in=Booking.ACTIVE_STATUSES)
         .filter(start_date__lte=last_day, end_date__gte=first_day)
         .select_related("car")
+        # เอาเฉพาะคอลัมน์ที่ปฏิทินใช้
+        .only(
+            "id",
+            "car_id",
+            "start_date",
+            "end_date",
+            "destination",
+            "status",
+            "car__plate_prefix",
+            "car__plate_number",
+            "car__province_full",
+            "car__color_code",
+            "car__display_plate",
+        )
         .order_by("start_date")
     )
 
     if car_id:
         qs = qs.filter(car_id=car_id)
 
-    bookings_by_day = {d: [] for week in month_days for d in week}
+    # สร้าง list เฉพาะวันที่มี booking (วันอื่น dict_get ใน template คืน [] ให้เอง)
+    bookings_by_day: dict[date, list] = {}
 
+    # ไล่เฉพาะวันที่ booking ทับกับช่วงที่ปฏิทินแสดง (ไม่เดินทุกวันของทริปยาว ๆ)
+    grid_first = month_days[0][0].toordinal()
+    grid_last = month_days[-1][-1].toordinal()
     for b in qs:
-        cur = b.start_date
-        while cur <= b.end_date:
-            if cur in bookings_by_day:
-                bookings_by_day[cur].append(b)
-            cur += timedelta(days=1)
+        lo = max(b.start_date.toordinal(), grid_first)
+        hi = min(b.end_date.toordinal(), grid_last)
+        for o in range(lo, hi + 1):
+            bookings_by_day.setdefault(date.fromordinal(o), []).append(b)
 
     cars = Car.objects.all().order_by("plate_prefix", "plate_number")
 
@@ -263,34 +526,49 @@ def user_booking_events(request):
     """
     API สำหรับ FullCalendar (ถ้าอยากย้ายไปโหลดผ่าน AJAX)
     """
-    qs = (
-        Booking.objects.filter(status__in=["BOOKED", "IN_USE"])
-        .select_related("car")
+    # .values() -> ได้ dict ตรง ๆ ไม่ต้องสร้าง Booking/Car object ทีละแถว
+    rows = (
+        Booking.objects.filter(status__in=Booking.ACTIVE_STATUSES)
+        .exclude(car_id=None)
         .order_by("start_date")
+        .values(
+            "id",
+            "car_id",
+            "start_date",
+            "end_date",
+            "destination",
+            "status",
+            "car__plate_prefix",
+            "car__plate_number",
+            "car__province_full",
+            "car__color_code",
+        )
     )
 
-    events = []
-    for b in qs:
-        if not b.car_id:
-            continue
-        events.append(
-            {
-                "id": b.id,
-                "title": f"{b.car.plate_prefix}{b.car.plate_number} {b.car.province_full}",
-                "start": b.start_date.isoformat(),
-                "end": (b.end_date + timedelta(days=1)).isoformat(),
+    def stream():
+        # ส่ง JSON array ทีละก้อน ไม่ต้องถือ event ทั้งหมดไว้ใน memory
+        yield "["
+        sep = ""
+        for r in rows.iterator(chunk_size=500):
+            event = {
+                "id": r["id"],
+                "title": f"{r['car__plate_prefix']}{r['car__plate_number']} {r['car__province_full']}",
+                "start": r["start_date"].isoformat(),
+                "end": (r["end_date"] + timedelta(days=1)).isoformat(),
                 "allDay": True,
-                "backgroundColor": b.car.color_code or "#6366f1",
-                "borderColor": b.car.color_code or "#6366f1",
+                "backgroundColor": r["car__color_code"] or "#6366f1",
+                "borderColor": r["car__color_code"] or "#6366f1",
                 "extendedProps": {
-                    "carId": b.car_id,
-                    "destination": b.destination or "",
-                    "status": b.status,
+                    "carId": r["car_id"],
+                    "destination": r["destination"] or "",
+                    "status": r["status"],
                 },
             }
-        )
+            yield sep + json.dumps(event, cls=DjangoJSONEncoder)
+            sep = ", "
+        yield "]"
 
-    return JsonResponse(events, safe=False)
+    return StreamingHttpResponse(stream(), content_type="application/json")
 
 
 # =============================================================================
@@ -312,18 +590,7 @@ def api_available_cars(request):
     if end < start:
         return JsonResponse({"ok": False, "error": "end_before_start"}, status=400)
 
-    busy_car_ids = (
-        Booking.objects.filter(status__in=["BOOKED", "IN_USE"])
-        .filter(start_date__lte=end, end_date__gte=start)
-        .values_list("car_id", flat=True)
-        .distinct()
-    )
-
-    cars = (
-        Car.objects.filter(status="READY")
-        .exclude(id__in=list(busy_car_ids))
-        .order_by("plate_prefix", "plate_number")
-    )
+    cars = available_cars_between(start, end)
 
     data = [
         {
@@ -346,9 +613,7 @@ def user_create_booking(request):
     ฟอร์มจองรถ: user_booking_form.html
     """
     cars = Car.objects.filter(status="READY").order_by("plate_prefix", "plate_number")
-    employees = Profile.objects.select_related("user").order_by(
-        "user__first_name", "user__last_name", "user__username"
-    )
+    employees = cache.get_or_set("booking:employee_options", _employee_options, 60)
 
     if request.method == "POST":
         car_id = request.POST.get("car") or ""
@@ -373,31 +638,39 @@ def user_create_booking(request):
                 {"cars": cars, "employees": employees},
             )
 
-        car = get_object_or_404(Car, id=car_id)
+        # ล็อกแถวรถไว้ระหว่างเช็กการทับ + สร้าง booking
+        # กันสองคำขอพร้อมกันผ่านการเช็กแล้วจองวันเดียวกันได้ทั้งคู่
+        with transaction.atomic():
+            car = get_object_or_404(Car.objects.select_for_update(), id=car_id)
 
-        conflict = (
-            Booking.objects.filter(car=car, status__in=["BOOKED", "IN_USE"])
-            .filter(start_date__lte=end, end_date__gte=start)
-            .exists()
-        )
-        if conflict:
-            messages.error(request, "รถคันนี้มีการจองทับช่วงวันดังกล่าวแล้ว กรุณาเลือกวันหรือรถใหม่")
-            return render(
-                request,
-                "booking/user_booking_form.html",
-                {"cars": cars, "employees": employees},
+            conflict = (
+                Booking.objects.filter(car=car, status__in=Booking.ACTIVE_STATUSES)
+                .filter(start_date__lte=end, end_date__gte=start)
+                .exists()
+            )
+            if conflict:
+                messages.error(request, "รถคันนี้มีการจองทับช่วงวันดังกล่าวแล้ว กรุณาเลือกวันหรือรถใหม่")
+                return render(
+                    request,
+                    "booking/user_booking_form.html",
+                    {"cars": cars, "employees": employees},
+                )
+            booking = Booking.objects.create(
+                car=car,
+                requester=request.user,
+                start_date=start,
+                end_date=end,
+                destination=destination,
+                status="BOOKED",
             )
-        booking = Booking.objects.create(
-            car=car,
-            requester=request.user,
-            start_date=start,
-            end_date=end,
-            destination=destination,
-            status="BOOKED",
-        )
 
-        if co_travelers_ids:
-            booking.co_travelers.set(Profile.objects.filter(id__in=co_travelers_ids))
+            if co_travelers_ids:
+                # booking เพิ่งสร้าง -> add ทีเดียว (INSERT หลายแถวใน query เดียว)
+                # เอาเฉพาะ id ที่มีจริง
+                existing = Profile.objects.filter(
+                    id__in=[i for i in co_travelers_ids if i.isdigit()]
+                ).values_list("id", flat=True)
+                booking.co_travelers.add(*existing)
 
         messages.success(request, "จองรถเรียบร้อย")
         return redirect("booking:user_dashboard")
@@ -419,17 +692,7 @@ def ajax_available_cars(request):
 
     # เงื่อนไขชนช่วงวัน (overlap):
     # มี booking ที่ start <= end_date และ end >= start_date
-    overlapping = Booking.objects.filter(
-        status__in=["BOOKED", "IN_USE"],  # ปรับตามสถานะที่ “กันรถ”
-        start_date__lte=end_date,
-        end_date__gte=start_date,
-    ).values_list("car_id", flat=True)
-
-    cars = (
-        Car.objects.filter(status="READY")
-        .exclude(id__in=overlapping)
-        .order_by("plate_prefix", "plate_number")
-    )
+    cars = available_cars_between(start_date, end_date)
 
     return JsonResponse(
         {
@@ -463,7 +726,7 @@ def user_cancel_booking(request, booking_id):
     booking = get_object_or_404(
         Booking.objects
             .select_related("car", "requester")
-            .prefetch_related("fuel_refills"),
+            .prefetch_related("fuel_refills", "co_travelers"),
         id=booking_id,
     )
 
@@ -504,11 +767,10 @@ def user_return_car(request):
         - YES: เก็บ odometer_after ไว้ใน session แล้ว redirect ไปหน้าเติมน้ำมัน (booking_id)
     """
     available_bookings = (
-        Booking.objects.exclude(status__in=["RETURNED", "CANCELLED"])
-        .filter(Q(requester=request.user) | Q(co_travelers__user=request.user))
-        .distinct()
+        Booking.objects.filter(status__in=Booking.OPEN_STATUSES)
+        .filter(member_of_booking_q(request.user))
         .select_related("car", "requester")
-        .order_by("-start_date", "-created_at")
+        .order_by("-start_date", "-created_at")[:RETURN_CAR_CHOICES_LIMIT]
     )
 
     booking = None
@@ -532,88 +794,86 @@ def user_return_car(request):
                 {"available_bookings": available_bookings, "booking": booking},
             )
 
-        if action == "start_use":
-            if booking.status != "BOOKED":
-                messages.error(request, "รายการนี้ไม่อยู่ในสถานะที่เริ่มใช้งานได้")
-                return redirect(f"{request.path}?booking_id={booking.id}")
-
-            odo_before = request.POST.get("odometer_before")
-            try:
-                odo_before_int = int(odo_before)
-            except (TypeError, ValueError):
-                messages.error(request, "เลขไมล์ก่อนต้องเป็นตัวเลข")
-                return redirect(f"{request.path}?booking_id={booking.id}")
-
-            booking.odometer_before = odo_before_int
-            booking.status = "IN_USE"
-            booking.save(update_fields=["odometer_before", "status", "updated_at"])
-
-            if booking.car:
-                booking.car.current_odometer = max(
-                    booking.car.current_odometer or 0, odo_before_int
-                )
-                booking.car.save(update_fields=["current_odometer"])
-
-            messages.success(request, "เริ่มใช้งานเรียบร้อย")
-            return redirect(f"{request.path}?booking_id={booking.id}")
-
-        if action == "return":
-            if booking.status != "IN_USE":
-                messages.error(request, "รายการนี้ไม่อยู่ในสถานะที่คืนรถได้")
-                return redirect(f"{request.path}?booking_id={booking.id}")
-
-            odo_after = request.POST.get("odometer_after")
-            try:
-                odo_after_int = int(odo_after)
-            except (TypeError, ValueError):
-                messages.error(request, "เลขไมล์หลังต้องเป็นตัวเลข")
-                return redirect(f"{request.path}?booking_id={booking.id}")
-
-            if (
-                booking.odometer_before is not None
-                and odo_after_int < booking.odometer_before
-            ):
-                messages.error(request, "เลขไมล์หลังต้องไม่ต่ำกว่าเลขไมล์ก่อน")
-                return redirect(f"{request.path}?booking_id={booking.id}")
-
-            has_fuel = (request.POST.get("has_fuel") or "").strip().upper()
-            if has_fuel not in ["YES", "NO"]:
-                messages.error(request, "กรุณาเลือกว่ามีการเติมน้ำมันหรือไม่ก่อนคืนรถ")
-                return redirect(f"{request.path}?booking_id={booking.id}")
-
-            if has_fuel == "NO":
+        # ล็อกแถว booking ไว้จนจบ action กันกดเริ่มใช้/คืนรถซ้ำพร้อมกัน
+        # และให้การบันทึก booking + เลขไมล์รถ commit ไปพร้อมกันครั้งเดียว
+        with transaction.atomic():
+            booking = (
+                Booking.objects.select_for_update(of=("self",))
+                .select_related("car", "requester")
+                .get(id=booking.id)
+            )
+            stay = f"{request.path}?booking_id={booking.id}"
+
+            if action == "start_use":
+                if booking.status != "BOOKED":
+                    messages.error(request, "รายการนี้ไม่อยู่ในสถานะที่เริ่มใช้งานได้")
+                    return redirect(stay)
+
+                odo_before_int = _parse_odometer(request.POST.get("odometer_before"))
+                if odo_before_int is None:
+                    messages.error(request, "เลขไมล์ก่อนต้องเป็นตัวเลข")
+                    return redirect(stay)
+
+                booking.odometer_before = odo_before_int
+                booking.status = "IN_USE"
+                booking.save(update_fields=["odometer_before", "status", "updated_at"])
+
+                if booking.car_id:
+                    _bump_car_odometer(booking.car_id, odo_before_int)
+
+                messages.success(request, "เริ่มใช้งานเรียบร้อย")
+                return redirect(stay)
+
+            if action == "return":
+                if booking.status != "IN_USE":
+                    messages.error(request, "รายการนี้ไม่อยู่ในสถานะที่คืนรถได้")
+                    return redirect(stay)
+
+                odo_after_int = _parse_odometer(request.POST.get("odometer_after"))
+                if odo_after_int is None:
+                    messages.error(request, "เลขไมล์หลังต้องเป็นตัวเลข")
+                    return redirect(stay)
+
+                if (
+                    booking.odometer_before is not None
+                    and odo_after_int < booking.odometer_before
+                ):
+                    messages.error(request, "เลขไมล์หลังต้องไม่ต่ำกว่าเลขไมล์ก่อน")
+                    return redirect(stay)
+
+                has_fuel = (request.POST.get("has_fuel") or "").strip().upper()
+                if has_fuel not in ["YES", "NO"]:
+                    messages.error(request, "กรุณาเลือกว่ามีการเติมน้ำมันหรือไม่ก่อนคืนรถ")
+                    return redirect(stay)
+
+                if has_fuel == "NO":
+                    booking.odometer_after = odo_after_int
+                    booking.status = "RETURNED"
+                    booking.returned_by = request.user
+                    booking.save(
+                        update_fields=[
+                            "odometer_after",
+                            "status",
+                            "returned_by",
+                            "updated_at",
+                        ]
+                    )
+
+                    if booking.car_id:
+                        _bump_car_odometer(booking.car_id, odo_after_int)
+
+                    messages.success(request, "คืนรถเรียบร้อยแล้ว (ไม่มีเติมน้ำมัน)")
+                    return redirect("booking:user_return_car")
+
+                # YES -> ตั้งสถานะรอคืนรถ (ยังไม่ RETURNED)
                 booking.odometer_after = odo_after_int
-                booking.status = "RETURNED"
+                booking.status = "PENDING_RETURN"
                 booking.returned_by = request.user
                 booking.save(
-                    update_fields=[
-                        "odometer_after",
-                        "status",
-                        "returned_by",
-                        "updated_at",
-                    ]
+                    update_fields=["odometer_after", "status", "returned_by", "updated_at"]
                 )
 
-                if booking.car:
-                    booking.car.current_odometer = max(
-                        booking.car.current_odometer or 0, odo_after_int
-                    )
-                    booking.car.save(update_fields=["current_odometer"])
-
-                messages.success(request, "คืนรถเรียบร้อยแล้ว (ไม่มีเติมน้ำมัน)")
-                return redirect("booking:user_return_car")
-
-            # YES -> ตั้งสถานะรอคืนรถ (ยังไม่ RETURNED)
-            booking.odometer_after = odo_after_int
-            booking.status = "PENDING_RETURN"
-            booking.returned_by = request.user
-            booking.save(
-                update_fields=["odometer_after", "status", "returned_by", "updated_at"]
-            )
-
-            return redirect(
-                f"{redirect('booking:user_fuel_refill').url}?booking_id={booking.id}"
-            )
+                return _fuel_refill_redirect(booking.id)
 
     return render(
         request,
@@ -639,8 +899,10 @@ def user_fuel_refill(request):
     booking_id = request.GET.get("booking_id") or request.POST.get("booking_id") or ""
     if booking_id:
         try:
-            b = Booking.objects.select_related("car", "requester").get(id=booking_id)
-            if is_booking_member(b, request.user):
+            b = with_membership(
+                Booking.objects.select_related("car", "requester"), request.user
+            ).get(id=booking_id)
+            if b.is_member:
                 booking = b
         except Booking.DoesNotExist:
             booking = None
@@ -670,93 +932,47 @@ def user_fuel_refill(request):
         )
 
     # --- 3) POST: บันทึกเติมน้ำมัน ---
-    car_id = request.POST.get("car_id")
-    yp_number = (request.POST.get("yp_number") or "").strip()
-    fuel_place = (request.POST.get("fuel_place") or "").strip()
-
-    refill_date = parse_date(request.POST.get("refill_date") or "")
-    if not refill_date:
-        refill_date = timezone.localdate()
-
-    odometer = request.POST.get("odometer")
-    price_per_liter = _to_decimal(request.POST.get("price_per_liter"))
-    liters = _to_decimal(request.POST.get("liters"))
-    total_price = _to_decimal(request.POST.get("total_price"))
-
     # ✅ helper redirect กลับหน้าเดิมให้ไม่หลุด booking_id
     def back():
-        if booking:
-            return redirect(
-                f"{redirect('booking:user_fuel_refill').url}?booking_id={booking.id}"
-            )
-        return redirect("booking:user_fuel_refill")
-
-    if not car_id:
-        messages.error(request, "กรุณาเลือกทะเบียนรถ")
-        return back()
+        return _fuel_refill_redirect(booking.id if booking else None)
 
-    if not fuel_place:
-        messages.error(request, "กรุณากรอกสถานที่เติมน้ำมัน 697")
+    form = UserFuelRefillForm(request.POST, booking=booking)
+    if not form.is_valid():
+        messages.error(request, form.first_error())
         return back()
 
-    if not yp_number:
-        messages.error(request, "กรุณากรอกเลข ยพ.")
-        return back()
-
-    if not odometer:
-        messages.error(request, "กรุณากรอกเลขไมล์")
-        return back()
-
-    try:
-        odometer_int = int(odometer)
-    except (TypeError, ValueError):
-        messages.error(request, "เลขไมล์ต้องเป็นตัวเลข 711")
-        return back()
-
-    if price_per_liter is None:
-        messages.error(request, "กรุณากรอกราคาน้ำมันต่อลิตรให้ถูกต้อง")
-        return back()
-
-    if liters is None:
-        messages.error(request, "กรุณากรอกจำนวนลิตรให้ถูกต้อง")
-        return back()
-
-    if total_price is None:
-        messages.error(request, "กรุณากรอกราคารวมให้ถูกต้อง")
-        return back()
-
-    car = get_object_or_404(Car, id=car_id)
-
-    FuelRefill.objects.create(
-        booking=booking,  # ต้องมี booking_id ถึงจะเป็นเคสต่อเคส
-        car=car,
-        refill_date=refill_date,
-        fuel_place=fuel_place,
-        yp_number=yp_number,
-        odometer=odometer_int,
-        price_per_liter=price_per_liter,
-        liters=liters,
-        total_price=total_price,
-    )
+    refill = form.save(commit=False)
+    refill.car = form.cleaned_data["car_id"]
+    refill.booking = booking  # ต้องมี booking_id ถึงจะเป็นเคสต่อเคส
+    refill.save()
 
     # ✅ ไม่คืนรถอัตโนมัติแล้ว (ลบ session auto-return ทิ้ง)
     messages.success(request, "บันทึกการเติมน้ำมันเรียบร้อย")
-    return redirect(
-        f"{redirect('booking:user_fuel_refill').url}?booking_id={booking.id}"
-    )
+    return back()
 
 
 @login_required
 def user_booking_detail(request, booking_id: int):
     booking = get_object_or_404(
-        Booking.objects.select_related(
-            "car", "requester", "returned_by"
-        ).prefetch_related("co_travelers", "co_travelers__user"),
+        with_membership(
+            Booking.objects.select_related(
+                "car", "requester", "returned_by"
+            ).prefetch_related(
+                # co_travelers ถูก prefetch ให้เองจาก lookup ซ้อน; user เอาแค่คอลัมน์ชื่อ
+                Prefetch(
+                    "co_travelers__user",
+                    queryset=User.objects.only(
+                        "id", "username", "first_name", "last_name"
+                    ),
+                )
+            ),
+            request.user,
+        ),
         id=booking_id,
     )
 
     # ✅ ให้ผู้สร้างคำขอ + ผู้เดินทางดูได้
-    if not is_booking_member(booking, request.user):
+    if not booking.is_member:
         return HttpResponseForbidden("Forbidden")
 
     fuels = (
@@ -775,32 +991,31 @@ def user_booking_detail(request, booking_id: int):
 @login_required
 @require_POST
 def user_confirm_return(request, booking_id):
-    booking = get_object_or_404(Booking, id=booking_id)
+    # ล็อกแถว booking กันยืนยันคืนรถซ้ำพร้อมกัน และ commit booking + รถครั้งเดียว
+    with transaction.atomic():
+        booking = get_object_or_404(
+            with_membership(Booking.objects.select_for_update(), request.user).annotate(
+                has_refill=Exists(FuelRefill.objects.filter(booking=OuterRef("pk")))
+            ),
+            id=booking_id,
+        )
 
-    if not is_booking_member(booking, request.user):
-        return HttpResponseForbidden("Forbidden")
+        if not booking.is_member:
+            return HttpResponseForbidden("Forbidden")
 
-    if booking.status != "PENDING_RETURN":
-        messages.error(request, "สถานะไม่ถูกต้อง")
-        return redirect(
-            f"{redirect('booking:user_fuel_refill').url}?booking_id={booking.id}"
-        )
+        if booking.status != "PENDING_RETURN":
+            messages.error(request, "สถานะไม่ถูกต้อง")
+            return _fuel_refill_redirect(booking.id)
 
-    if not FuelRefill.objects.filter(booking=booking).exists():
-        messages.error(request, "ต้องมีรายการเติมน้ำมันอย่างน้อย 1 รายการ")
-        return redirect(
-            f"{redirect('booking:user_fuel_refill').url}?booking_id={booking.id}"
-        )
+        if not booking.has_refill:
+            messages.error(request, "ต้องมีรายการเติมน้ำมันอย่างน้อย 1 รายการ")
+            return _fuel_refill_redirect(booking.id)
 
-    booking.status = "RETURNED"
-    booking.save(update_fields=["status", "updated_at"])
+        booking.status = "RETURNED"
+        booking.save(update_fields=["status", "updated_at"])
 
-    if booking.car and booking.odometer_after is not None:
-        booking.car.current_odometer = max(
-            booking.car.current_odometer or 0, booking.odometer_after
-        )
-        booking.car.status = "READY"
-        booking.car.save(update_fields=["current_odometer", "status"])
+        if booking.car_id and booking.odometer_after is not None:
+            _bump_car_odometer(booking.car_id, booking.odometer_after, status="READY")
 
     messages.success(request, "ยืนยันคืนรถเรียบร้อย")
     return redirect("booking:user_dashboard")
@@ -815,13 +1030,41 @@ def user_confirm_return(request, booking_id):
 def admin_dashboard(request):
     today = timezone.localdate()
 
-    total_cars = Car.objects.count()
-    total_users = User.objects.count()
+    # ตัวเลขสรุปไม่ต้องตรงทุกวินาที เก็บ cache ไว้สั้น ๆ
+    totals = cache.get_or_set("booking:dashboard_totals", _dashboard_totals, 60)
 
     active_bookings = (
-        Booking.objects.filter(status__in=["BOOKED", "IN_USE"])
+        Booking.objects.filter(status__in=Booking.ACTIVE_STATUSES)
         .filter(start_date__lte=today, end_date__gte=today)  # ✅ เฉพาะของวันนี้
         .select_related("car", "requester")
+        # ดึงแค่คอลัมน์ที่ admin_dashboard.html ใช้แสดง
+        .only(
+            "id",
+            "status",
+            "start_date",
+            "end_date",
+            "destination",
+            "car__plate_prefix",
+            "car__plate_number",
+            "car__province_full",
+            "car__brand_name",
+            "car__model_name",
+            "requester__username",
+            "requester__first_name",
+            "requester__last_name",
+        )
+        .prefetch_related(
+            Prefetch(
+                "co_travelers",
+                queryset=Profile.objects.select_related("user").only(
+                    "id",
+                    "division",
+                    "user__first_name",
+                    "user__last_name",
+                    "user__username",
+                ),
+            )
+        )
         .order_by("car__plate_prefix", "car__plate_number", "start_date", "created_at")
     )
 
@@ -829,8 +1072,7 @@ def admin_dashboard(request):
         request,
         "booking/admin_dashboard.html",
         {
-            "total_cars": total_cars,
-            "total_users": total_users,
+            **totals,
             "active_bookings": active_bookings,
             "today": today,  # ✅ ส่งให้ template ใช้โชว์หัวข้อ “วันนี้”
         },
@@ -841,16 +1083,35 @@ def admin_dashboard(request):
 def admin_employee_list(request):
     profiles = (
         Profile.objects.select_related("user")
-        .annotate(
-            status_rank=Case(
+        .only(
+            "id",
+            "department",
+            "position",
+            "role",
+            "work_status",
+            "user__id",
+            "user__username",
+            "user__first_name",
+            "user__last_name",
+        )
+        # ACTIVE ขึ้นก่อน: ใช้ CASE แค่ใน ORDER BY ไม่ต้องเลือกออกมาเป็นคอลัมน์
+        .order_by(
+            Case(
                 When(work_status="ACTIVE", then=Value(0)),
                 default=Value(1),
                 output_field=IntegerField(),
-            )
+            ),
+            "user__username",
         )
-        .order_by("status_rank", "user__username")
     )
-    return render(request, "booking/admin_employees.html", {"profiles": profiles})
+    page_obj = Paginator(profiles, ADMIN_LIST_PAGE_SIZE).get_page(
+        request.GET.get("page")
+    )
+    return render(
+        request,
+        "booking/admin_employees.html",
+        {"profiles": page_obj.object_list, "page_obj": page_obj},
+    )
 
 @admin_required
 def admin_employee_create(request):
@@ -865,23 +1126,27 @@ def admin_employee_create(request):
         position = form.cleaned_data["position"]
         role = form.cleaned_data["role"]
 
-        if User.objects.filter(username=employee_code).exists():
+        # policy: username=รหัสพนักงาน, password=รหัสพนักงาน
+        # สร้าง user + profile ใน transaction เดียว (commit ครั้งเดียว ไม่มี user ค้างไร้ profile)
+        # รหัสซ้ำให้ UNIQUE ของ username ใน DB เป็นตัวกัน (ไม่ต้อง SELECT เช็กก่อน กันกดพร้อมกันด้วย)
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(
+                    username=employee_code,
+                    password=employee_code,
+                    first_name=first_name,
+                    last_name=last_name,
+                )
+                Profile.objects.create(
+                    user=user,
+                    division=division,
+                    department=department,
+                    position=position,
+                    role=role,
+                )
+        except IntegrityError:
             messages.error(request, "รหัสพนักงานนี้มีอยู่แล้ว")
         else:
-            # policy: username=รหัสพนักงาน, password=รหัสพนักงาน
-            user = User.objects.create_user(
-                username=employee_code,
-                password=employee_code,
-                first_name=first_name,
-                last_name=last_name,
-            )
-            Profile.objects.create(
-                user=user,
-                division=division,
-                department=department,
-                position=position,
-                role=role,
-            )
             messages.success(request, "เพิ่มพนักงานเรียบร้อย (รหัสผ่าน = รหัสพนักงาน)")
             return redirect("booking:admin_employee_list")
 
@@ -892,23 +1157,33 @@ def admin_employee_create(request):
 @admin_required
 @require_POST
 def admin_employee_toggle_status(request, profile_id):
-    profile = get_object_or_404(Profile, id=profile_id)
+    profile = get_object_or_404(
+        Profile.objects.select_related("user").only(
+            "id", "work_status", "user__first_name", "user__last_name"
+        ),
+        id=profile_id,
+    )
 
     if profile.work_status == "ACTIVE":
-        profile.work_status = "INACTIVE"
         msg = f"{profile.user.get_full_name()} ถูกปรับเป็นพ้นสภาพแล้ว"
     else:
-        profile.work_status = "ACTIVE"
         msg = f"{profile.user.get_full_name()} กลับมาปฏิบัติงานแล้ว"
 
-    profile.save(update_fields=["work_status"])
+    # สลับสถานะใน UPDATE เดียว (อิงค่าปัจจุบันใน DB)
+    Profile.objects.filter(id=profile.id).update(
+        work_status=Case(
+            When(work_status="ACTIVE", then=Value("INACTIVE")),
+            default=Value("ACTIVE"),
+        )
+    )
     messages.success(request, msg)
     return redirect("booking:admin_employee_list")
 
 
 @admin_required
 def admin_employee_edit(request, user_id: int):
-    user = get_object_or_404(User, id=user_id)
+    # ดึง profile มาพร้อม user ใน query เดียว (get_profile จะไม่ query ซ้ำ)
+    user = get_object_or_404(User.objects.select_related("profile"), id=user_id)
     profile = get_profile(user)
 
     initial = {
@@ -935,16 +1210,20 @@ def admin_employee_edit(request, user_id: int):
         if new_username and new_username != old_username:
             user.set_password(new_username)
 
-        user.save()
-
-        if profile is None:
-            profile = Profile.objects.create(user=user)
+        profile_fields = {
+            "division": form.cleaned_data["division"],
+            "department": form.cleaned_data["department"],
+            "position": form.cleaned_data["position"],
+            "role": form.cleaned_data["role"],
+        }
 
-        profile.division = form.cleaned_data["division"]
-        profile.department = form.cleaned_data["department"]
-        profile.position = form.cleaned_data["position"]
-        profile.role = form.cleaned_data["role"]
-        profile.save()
+        with transaction.atomic():
+            user.save()
+            # มี profile อยู่แล้ว -> UPDATE ตรง ๆ, ยังไม่มี -> INSERT พร้อมค่าครบในครั้งเดียว
+            if profile is None:
+                Profile.objects.create(user=user, **profile_fields)
+            else:
+                Profile.objects.filter(pk=profile.pk).update(**profile_fields)
 
         messages.success(request, "บันทึกข้อมูลพนักงานเรียบร้อย")
         return redirect("booking:admin_employee_list")
@@ -958,18 +1237,17 @@ def admin_employee_edit(request, user_id: int):
 
 @admin_required
 def admin_employee_delete(request, user_id):
-    user = get_object_or_404(User, id=user_id)
-    profile = getattr(user, "profile", None)
-
     if request.method == "POST":
-        # ปิดการใช้งาน user
-        user.is_active = False
-        user.save(update_fields=["is_active"])
-
-        # (ถ้ามี role / status)
-        if profile:
-            profile.role = "INACTIVE"   # หรือเก็บ field status เพิ่ม
-            profile.save(update_fields=["role"])
+        # UPDATE ตรง ๆ ไม่ต้องโหลด user/profile มาก่อน
+        with transaction.atomic():
+            # ปิดการใช้งาน user
+            if not User.objects.filter(id=user_id).update(is_active=False):
+                raise Http404("No User matches the given query.")
+
+            # (ถ้ามี role / status)
+            Profile.objects.filter(user_id=user_id).update(
+                role="INACTIVE"  # หรือเก็บ field status เพิ่ม
+            )
 
         messages.success(request, "ปิดการใช้งานพนักงานเรียบร้อย")
     return redirect("booking:admin_employee_list")
@@ -979,17 +1257,34 @@ def admin_employee_delete(request, user_id):
 @admin_required
 def admin_car_list(request):
     cars = (
-        Car.objects.all()
-        .annotate(
-            status_rank=Case(
+        Car.objects.only(
+            "id",
+            "display_plate",
+            "brand_name",
+            "model_name",
+            "seat_count",
+            "usage_type",
+            "status",
+            "color_code",
+        )
+        .order_by(
+            Case(
                 When(status="RETIRED", then=Value(1)),  # ยกเลิกใช้งานลงล่าง
                 default=Value(0),
                 output_field=IntegerField(),
-            )
+            ),
+            "plate_prefix",
+            "plate_number",
         )
-        .order_by("status_rank", "plate_prefix", "plate_number")
     )
-    return render(request, "booking/admin_cars.html", {"cars": cars})
+    page_obj = Paginator(cars, ADMIN_LIST_PAGE_SIZE).get_page(
+        request.GET.get("page")
+    )
+    return render(
+        request,
+        "booking/admin_cars.html",
+        {"cars": page_obj.object_list, "page_obj": page_obj},
+    )
 
 
 @admin_required
@@ -1066,7 +1361,7 @@ def admin_booking_list(request):
     selected_car_id = int(car_id_raw) if car_id_raw.isdigit() else None
 
     status_filter = (request.GET.get("status") or "all").strip().lower()
-    if status_filter not in ("all", "book", "return"):
+    if status_filter not in BOOKING_LIST_STATUS_FILTERS:
         status_filter = "all"
 
     # -----------------------------
@@ -1084,75 +1379,57 @@ def admin_booking_list(request):
     # 4) Query หลัก: bookings ตามเดือน/ปี
     # -----------------------------
     # เลือกกรองเดือนจาก end_date (เข้าใจง่ายสุด: ทริปที่ "จบ" ในเดือนนั้น)
-    # ถ้าเตงอยากใช้ updated_at (คืนจริง) ให้เปลี่ยน filter เป็น updated_at__date
-    qs = (
-        Booking.objects.select_related("car", "requester")
-        .filter(end_date__gte=first_day, end_date__lte=last_day)
-        .order_by("-end_date", "-id")
-    )
-
+    # ถ้าเตงอยากใช้ updated_at (คืนจริง) ให้กรองด้วย _local_day_range(first_day, last_day)
+    # ขอบเขตเดือน/รถ (ใช้ทั้งตารางและ summary)
+    scope = {"end_date__gte": first_day, "end_date__lte": last_day}
     if selected_car_id:
-        qs = qs.filter(car_id=selected_car_id)
+        scope["car_id"] = selected_car_id
 
     # -----------------------------
     # 5) logic ปุ่ม 3 อัน (ทั้งหมด/เฉพาะการจอง/เฉพาะคืนรถ)
     # -----------------------------
     # NOTE: สถานะในระบบเตงใช้: BOOKED, IN_USE, RETURNED, CANCELLED
-    if status_filter == "book":
-        qs = qs.filter(status__in=["BOOKED", "IN_USE"])
-    elif status_filter == "return":
-        qs = qs.filter(status="RETURNED")
-    # all = ไม่กรองเพิ่ม (รวมทุกสถานะในเดือน)
+    qs = (
+        Booking.objects.select_related("car", "requester")
+        .only(*BOOKING_ROW_FIELDS)
+        .filter(**scope, **BOOKING_LIST_STATUS_FILTERS[status_filter])
+        .order_by("-end_date", "-id")
+    )
 
-    bookings = list(qs)
+    # แบ่งหน้า: ดึงจาก DB ทีละหน้า (LIMIT/OFFSET) ไม่โหลดทั้งเดือนมาไว้ใน memory
+    page_obj = Paginator(qs, ADMIN_LIST_PAGE_SIZE).get_page(request.GET.get("page"))
 
     # -----------------------------
     # 6) Summary (นับตามเดือน/ปี/รถที่เลือก)
     # -----------------------------
-    base = Booking.objects.filter(end_date__gte=first_day, end_date__lte=last_day)
-    if selected_car_id:
-        base = base.filter(car_id=selected_car_id)
-
-    count_returned = base.filter(status="RETURNED").count()
-    count_in_use = base.filter(status="IN_USE").count()
-    count_all = base.count()
-
-    # -----------------------------
-    # 7) months list สำหรับ dropdown
-    # -----------------------------
-    months = [
-        {"value": 1, "label": "มกราคม"},
-        {"value": 2, "label": "กุมภาพันธ์"},
-        {"value": 3, "label": "มีนาคม"},
-        {"value": 4, "label": "เมษายน"},
-        {"value": 5, "label": "พฤษภาคม"},
-        {"value": 6, "label": "มิถุนายน"},
-        {"value": 7, "label": "กรกฎาคม"},
-        {"value": 8, "label": "สิงหาคม"},
-        {"value": 9, "label": "กันยายน"},
-        {"value": 10, "label": "ตุลาคม"},
-        {"value": 11, "label": "พฤศจิกายน"},
-        {"value": 12, "label": "ธันวาคม"},
-    ]
+    # นับทั้ง 3 ตัวใน query เดียว (COUNT ... FILTER) เปิดซ้ำเดือนเดิมใช้ค่าจาก cache
+    counts = cache.get_or_set(
+        booking_data_cache_key("booking_list_counts", first_day, selected_car_id),
+        lambda: Booking.objects.filter(**scope).aggregate(
+            count_returned=Count("pk", filter=Q(status="RETURNED")),
+            count_in_use=Count("pk", filter=Q(status="IN_USE")),
+            count_all=Count("pk"),
+        ),
+        REPORT_COUNTS_CACHE_TIMEOUT,
+    )
 
     context = {
         # ตาราง
-        "bookings": bookings,
+        "bookings": page_obj,
+        "page_obj": page_obj,
 
         # tabs เดิม
         "status_filter": status_filter,
 
         # filter bar ใหม่
-        "months": months,
+        "months": MONTH_OPTIONS,
         "month": month,
         "year": year,
         "cars": cars,
         "selected_car_id": selected_car_id,
 
         # summary ใหม่
-        "count_returned": count_returned,
-        "count_in_use": count_in_use,
-        "count_all": count_all,
+        **counts,
     }
 
     return render(request, "booking/admin_booking_list.html", context)
@@ -1179,24 +1456,9 @@ def admin_booking_detail(request, booking_id: int):
 
 @admin_required
 def admin_booking_edit(request, booking_id: int):
-    booking = get_object_or_404(
-        Booking.objects.select_related(
-            "car", "requester", "returned_by"
-        ).prefetch_related("co_travelers", "co_travelers__user"),
-        id=booking_id,
-    )
-
-    cars = Car.objects.all().order_by("plate_prefix", "plate_number")
-    users = User.objects.all().order_by("first_name", "last_name", "username")
-
-    # ✅ เพิ่ม: ดึงรายการเติมน้ำมันของ booking นี้
-    fuels = (
-        FuelRefill.objects.filter(booking=booking)
-        .select_related("car")
-        .order_by("-refill_date", "-created_at")
-    )
-
     if request.method == "POST":
+        # POST แค่บันทึกแล้ว redirect ไม่ต้อง join/prefetch อะไร
+        booking = get_object_or_404(Booking, id=booking_id)
         booking.car_id = request.POST.get("car") or booking.car_id
         booking.start_date = parse_date(request.POST.get("start_date"))
         booking.end_date = parse_date(request.POST.get("end_date"))
@@ -1247,6 +1509,33 @@ def admin_booking_edit(request, booking_id: int):
 
         return redirect("booking:admin_booking_detail", booking_id=booking.id)
 
+    booking = get_object_or_404(
+        Booking.objects.select_related(
+            "car", "requester", "returned_by"
+        ).prefetch_related("co_travelers"),
+        id=booking_id,
+    )
+
+    # dropdown: ดึงเฉพาะคอลัมน์ที่ใช้แสดงใน option
+    cars = (
+        Car.objects.only("id", "plate_prefix", "plate_number", "brand_name", "model_name")
+        .order_by("plate_prefix", "plate_number")
+    )
+    users = (
+        User.objects.only("id", "username", "first_name", "last_name")
+        .order_by("first_name", "last_name", "username")
+    )
+    profiles = Profile.objects.select_related("user").only(
+        "id", "division", "user__username", "user__first_name", "user__last_name"
+    )
+
+    # ✅ เพิ่ม: ดึงรายการเติมน้ำมันของ booking นี้
+    fuels = (
+        FuelRefill.objects.filter(booking=booking)
+        .select_related("car")
+        .order_by("-refill_date", "-created_at")
+    )
+
     return render(
         request,
         "booking/admin_booking_edit.html",
@@ -1254,7 +1543,7 @@ def admin_booking_edit(request, booking_id: int):
             "booking": booking,
             "cars": cars,
             "users": users,
-            "profiles": Profile.objects.select_related("user"),
+            "profiles": profiles,
             "fuels": fuels,  # ✅ เพิ่ม
         },
     )
@@ -1262,30 +1551,33 @@ def admin_booking_edit(request, booking_id: int):
 @admin_required
 def admin_booking_detail_api(request, booking_id: int):
     b = get_object_or_404(
-    Booking.objects.select_related(
-        "car", "requester", "returned_by"
-    ).prefetch_related(
-        "fuel_refills",
-        "co_travelers__user",
-    ),
-    id=booking_id,
-)
-
+        Booking.objects.select_related("car", "requester", "returned_by")
+        # ใช้แค่จำนวนรายการเติมน้ำมัน นับมาใน query เดียวกับ booking
+        .annotate(fuel_cnt=Count("fuel_refills")),
+        id=booking_id,
+    )
 
     # -------------------------
     # เติมน้ำมัน
     # -------------------------
-    fuel_cnt = b.fuel_refills.count()
+    fuel_cnt = b.fuel_cnt
     fuel_text = f"มี {fuel_cnt} รายการ" if fuel_cnt > 0 else "ไม่มีการเติมน้ำมัน"
 
     # -------------------------
     # ผู้เดินทาง
     # -------------------------
-    co_names = []
-    for p in b.co_travelers.all():
-        u = getattr(p, "user", None)
-        if u:
-            co_names.append(u.get_full_name() or u.username)
+    # ใช้แค่ชื่อ: ให้ DB ประกอบชื่อเต็ม (ไม่มีชื่อ -> username) ใน join query เดียว
+    co_names = list(
+        b.co_travelers.annotate(
+            display_name=Coalesce(
+                NullIf(
+                    Trim(Concat("user__first_name", Value(" "), "user__last_name")),
+                    Value(""),
+                ),
+                "user__username",
+            )
+        ).values_list("display_name", flat=True)
+    )
 
     co_travelers_text = ", ".join(co_names) if co_names else "-"
 
@@ -1328,59 +1620,89 @@ def admin_monthly_audit(request):
     # dropdown รถทั้งหมด
     cars = Car.objects.all().order_by("plate_prefix", "plate_number")
 
+    # ขอบเขตของ 2 ตาราง (ใช้ทั้งตอนดึงแถวและตอนนับการ์ดสรุป)
+    # (A) คืนรถแล้ว 'ในเดือนที่เลือก' (อิงวันที่คืนจริง: updated_at)
+    returned_from, returned_until = _local_day_range(first_day, last_day)
+    returned_month_q = Q(
+        status="RETURNED",
+        updated_at__gte=returned_from,
+        updated_at__lt=returned_until,
+    )
+    # (B) จอง/กำลังใช้งาน "ภายในเดือนที่เลือก" (ช่วงทับซ้อนเดือน)
+    active_month_q = Q(
+        status__in=Booking.ACTIVE_STATUSES,
+        start_date__lte=last_day,
+        end_date__gte=first_day,
+    )
+    # กรองรถ (ถ้าเลือก) ใส่รวมใน filter เดียวกับขอบเขตเดือน
+    car_q = Q(car_id=selected_car_id) if selected_car_id else Q()
+
     # =========================================================
     # (A) คืนรถแล้ว 'ในเดือนที่เลือก' (อิงวันที่คืนจริง: updated_at)
     # =========================================================
     qs_returned_month = (
-        Booking.objects.filter(status="RETURNED")
-        .filter(updated_at__date__gte=first_day, updated_at__date__lte=last_day)
-        .select_related("car", "requester", "returned_by")
+        Booking.objects.filter(returned_month_q, car_q)
+        .select_related("car", "requester")
+        .only(*BOOKING_ROW_FIELDS, "destination", "odometer_before", "odometer_after")
+        # template วนแสดงรายการเติมน้ำมันด้วย จึงยัง prefetch (จำนวนใช้ len ของที่ prefetch มา)
         .prefetch_related("fuel_refills")
+        # ระยะทาง = after - before คิดใน SQL (ขาดตัวใดตัวหนึ่ง -> NULL)
+        .annotate(
+            dist=ExpressionWrapper(
+                F("odometer_after") - F("odometer_before"),
+                output_field=IntegerField(),
+            )
+        )
+        # ✅ เช็กเลขไมล์: ขาด -> MISSING, ถอยหลัง -> NEGATIVE, ปกติ -> NULL
+        .annotate(
+            issue=Case(
+                When(dist__isnull=True, then=Value("MISSING")),
+                When(dist__lt=0, then=Value("NEGATIVE")),
+                default=None,
+                output_field=CharField(),
+            )
+        )
         .order_by("car__plate_prefix", "car__plate_number", "start_date", "end_date")
     )
-    if selected_car_id:
-        qs_returned_month = qs_returned_month.filter(car_id=selected_car_id)
-
-    rows = []
-    for b in qs_returned_month:
-        dist = None
-        issue = None
-
-        # ✅ เช็กเลขไมล์
-        if getattr(b, "odometer_before", None) is None or getattr(b, "odometer_after", None) is None:
-            issue = "MISSING"
-        else:
-            try:
-                dist = int(b.odometer_after) - int(b.odometer_before)
-                if dist < 0:
-                    issue = "NEGATIVE"
-            except Exception:
-                issue = "MISSING"
 
-        fuel_count = 0
-        if hasattr(b, "fuel_refills"):
-            fuel_count = b.fuel_refills.all().count()
-
-        rows.append({"b": b, "dist": dist, "issue": issue, "fuel_count": fuel_count})
+    def returned_rows():
+        # LIMIT ใน SQL ไม่ต้องสร้าง object ของทั้งเดือน
+        return [
+            {
+                "b": b,
+                "dist": b.dist,
+                "issue": b.issue,
+                "fuel_count": len(b.fuel_refills.all()),
+            }
+            for b in qs_returned_month[:AUDIT_ROWS_LIMIT]
+        ]
 
     # =========================================================
     # (B) จอง/กำลังใช้งาน "ภายในเดือนที่เลือก" (ช่วงทับซ้อนเดือน)
     # =========================================================
     qs_booked_in_use_month = (
-        Booking.objects.filter(status__in=["BOOKED", "IN_USE"])
-        .filter(start_date__lte=last_day, end_date__gte=first_day)  # ทับซ้อนเดือน
-        .select_related("car", "requester", "returned_by")
+        Booking.objects.filter(active_month_q, car_q)
+        .select_related("car", "requester")
+        .only(*BOOKING_ROW_FIELDS, "destination", "odometer_before", "odometer_after")
         .order_by("-start_date", "-id")
     )
-    if selected_car_id:
-        qs_booked_in_use_month = qs_booked_in_use_month.filter(car_id=selected_car_id)
 
     # =========================================================
     # ✅ สรุปการ์ดด้านบน
     # =========================================================
-    count_returned = qs_returned_month.count()
-    count_in_use = qs_booked_in_use_month.filter(status="IN_USE").count()
-    count_all = count_returned + qs_booked_in_use_month.count()
+    # นับทั้ง 2 ขอบเขตใน query เดียว (ไม่ผูกกับจำนวนแถวที่ดึงมาแสดง)
+    counts = cache.get_or_set(
+        booking_data_cache_key("audit_counts", first_day, selected_car_id),
+        lambda: Booking.objects.filter(returned_month_q | active_month_q, car_q).aggregate(
+            count_returned=Count("pk", filter=Q(status="RETURNED")),
+            count_in_use=Count("pk", filter=Q(status="IN_USE")),
+            count_booked_or_use=Count("pk", filter=Q(status__in=Booking.ACTIVE_STATUSES)),
+        ),
+        REPORT_COUNTS_CACHE_TIMEOUT,
+    )
+    count_returned = counts["count_returned"]
+    count_in_use = counts["count_in_use"]
+    count_all = count_returned + counts["count_booked_or_use"]
 
     # =========================================================
     # เลือกข้อมูลตามปุ่ม (all / booked / returned)
@@ -1390,9 +1712,9 @@ def admin_monthly_audit(request):
         rows_to_show = []
     elif kind == "returned":
         bookings_list = Booking.objects.none()
-        rows_to_show = rows
+        rows_to_show = returned_rows()
     else:
-        rows_to_show = rows
+        rows_to_show = returned_rows()
 
     return render(
         request,
@@ -1405,7 +1727,7 @@ def admin_monthly_audit(request):
             "cars": cars,
             "selected_car_id": selected_car_id,
             "rows": rows_to_show,
-            "bookings_list": bookings_list[:300],
+            "bookings_list": bookings_list[:AUDIT_ROWS_LIMIT],
             "count_returned": count_returned,
             "count_in_use": count_in_use,
             "count_all": count_all,
@@ -1426,8 +1748,10 @@ def admin_export_fuel_excel(request):
     # ===== เลือกคันเดียว =====
     if car_id and str(car_id).isdigit():
         car = Car.objects.get(id=int(car_id))
+        first_day = date(year, month, 1)
+        last_day = date(year, month, calendar.monthrange(year, month)[1])
         refills = FuelRefill.objects.filter(
-            car=car, refill_date__year=year, refill_date__month=month
+            car=car, refill_date__range=(first_day, last_day)
         ).order_by("refill_date")
 
         car_display = (
@@ -1467,18 +1791,20 @@ def admin_export_fuel_excel(request):
         carline_text = f"เลขทะเบียนรถ {car_display}    รหัสพาหนะ {vehicle_code}    ประเภทรถ {car_type}"
 
         # --- เลขไมล์ต้นเดือน: เอาจาก booking ที่ RETURNED รายการแรกของเดือนนั้น ---
-        first_booking = (
+        # (ตามลำดับเวลาคืนรถ ไม่ใช่ MIN) ดึงมาแค่ค่าเดียว ไม่ต้องสร้าง Booking ทั้งแถว
+        returned_from, returned_until = _local_day_range(first_day, last_day)
+        odo_start = (
             Booking.objects.filter(
                 car=car,
                 status="RETURNED",
-                updated_at__year=year,
-                updated_at__month=month,
+                updated_at__gte=returned_from,
+                updated_at__lt=returned_until,
                 odometer_before__isnull=False,
             )
             .order_by("updated_at", "id")
+            .values_list("odometer_before", flat=True)
             .first()
         )
-        odo_start = int(first_booking.odometer_before) if first_booking else None
 
         bio = build_fuel_excel(
             template_excel, title_text, carline_text, odo_start, refills
@@ -1501,19 +1827,27 @@ def admin_export_fuel_excel(request):
 def admin_export_fuel_excel_all_zip(month: int, year: int, template_excel: str):
     cars = Car.objects.all().order_by("plate_prefix", "plate_number")
 
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+    # รายการเติมน้ำมันทั้งเดือนของทุกคันใน query เดียว แล้วแยกตาม car_id
+    refills_by_car = defaultdict(list)
+    first_day = date(year, month, 1)
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+    for refill in FuelRefill.objects.filter(
+        refill_date__range=(first_day, last_day)
+    ).order_by("car_id", "refill_date"):
+        refills_by_car[refill.car_id].append(refill)
+
+    title_text = (
+        f"รายงานการใช้น้ำมันเชื้อเพลิงและน้ำมันหล่อลื่น ประจำเดือน {month:02d}/{year}"
+    )
+
+    # สร้าง workbook ทีละคันตอนที่ client กำลังรับไฟล์ (ไม่ต้องถือทั้ง zip ไว้ในหน่วยความจำ)
+    def workbooks():
         for car in cars:
-            refills = FuelRefill.objects.filter(
-                car=car, refill_date__year=year, refill_date__month=month
-            ).order_by("refill_date")
+            refills = refills_by_car[car.id]
 
             car_display = (
                 f"{car.plate_prefix} {car.plate_number} {car.province_full}".strip()
             )
-            title_text = (
-                f"รายงานการใช้น้ำมันเชื้อเพลิงและน้ำมันหล่อลื่น ประจำเดือน {month:02d}/{year}"
-            )
             carline_text = f"เลขทะเบียนรถ {car_display}"
             odo_start = None
 
@@ -1522,11 +1856,10 @@ def admin_export_fuel_excel_all_zip(month: int, year: int, template_excel: str):
             )
 
             inner_name = f"รายงานน้ำมัน_{car.plate_prefix}{car.plate_number}_{year}_{month:02d}.xlsx"
-            zf.writestr(inner_name, bio.getvalue())
+            yield inner_name, bio.getvalue()
 
-    zip_buffer.seek(0)
     filename = f"รายงานน้ำมัน_รวมทั้งหมด_{year}_{month:02d}.zip"
-    resp = HttpResponse(zip_buffer.getvalue(), content_type="application/zip")
+    resp = StreamingHttpResponse(iter_zip(workbooks()), content_type="application/zip")
     resp["Content-Disposition"] = f'attachment; filename="{filename}"'
     return resp
 
@@ -1617,28 +1950,27 @@ def admin_export_car_docx(request):
     first_day = date(year, month, 1)
     last_day = date(year, month, calendar.monthrange(year, month)[1])
 
-    month_bookings = (
-        Booking.objects.filter(
-            car=car,
-            status="RETURNED",
-            updated_at__date__gte=first_day,
-            updated_at__date__lte=last_day,
-        )
-        .exclude(odometer_before__isnull=True, odometer_after__isnull=True)
-        .order_by("updated_at", "id")
+    returned_from, returned_until = _local_day_range(first_day, last_day)
+    month_bookings = Booking.objects.filter(
+        car=car,
+        status="RETURNED",
+        updated_at__gte=returned_from,
+        updated_at__lt=returned_until,
     )
 
-    mileage_start = None
-    for b in month_bookings:
-        if b.odometer_before is not None:
-            mileage_start = int(b.odometer_before)
-            break
-
-    mileage_end = None
-    for b in month_bookings.order_by("-updated_at", "-id"):
-        if b.odometer_after is not None:
-            mileage_end = int(b.odometer_after)
-            break
+    # เอาตามลำดับเวลาคืนรถ (ไม่ใช่ MIN/MAX): ให้ DB หาแถวแรก/แถวสุดท้ายที่มีค่า ดึงมาแค่ค่าเดียว
+    mileage_start = (
+        month_bookings.filter(odometer_before__isnull=False)
+        .order_by("updated_at", "id")
+        .values_list("odometer_before", flat=True)
+        .first()
+    )
+    mileage_end = (
+        month_bookings.filter(odometer_after__isnull=False)
+        .order_by("-updated_at", "-id")
+        .values_list("odometer_after", flat=True)
+        .first()
+    )
 
     # =========================
     # 3) เตรียม path template Word
@@ -1653,21 +1985,6 @@ def admin_export_car_docx(request):
     # -------------------------
     # เตรียมค่าเดือน/ปีไทย + สัญญา (กัน NameError)
     # -------------------------
-    TH_MONTHS = [
-        "",
-        "มกราคม",
-        "กุมภาพันธ์",
-        "มีนาคม",
-        "เมษายน",
-        "พฤษภาคม",
-        "มิถุนายน",
-        "กรกฎาคม",
-        "สิงหาคม",
-        "กันยายน",
-        "ตุลาคม",
-        "พฤศจิกายน",
-        "ธันวาคม",
-    ]
     month_th = TH_MONTHS[month] if 1 <= month <= 12 else str(month)
     year_th = str(year + 543)
 
@@ -1822,8 +2139,4 @@ def admin_fuel_refill_update_ajax(request, refill_id: int):
             "total_price": str(refill.total_price) if refill.total_price is not None else "-",
             "refill_date_th": refill_date_th,
         }
-<<<<<<< HEAD
-    )
-=======
     )
->>>>>>> 1dd83bc (แกไขการแกไขเตมนำมนเพมสถานะพนกงานพนสภาพ และจดเรยงพรอมแกไขรายการรถ/พนกงาน)
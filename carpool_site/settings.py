@@ -72,6 +72,17 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # รันทุกครั้งที่เปิด connection ใหม่ (Django 5.1+)
+            # WAL: หลายคนอ่านพร้อมกันได้ระหว่างมีคนเขียน / cache 64 MB / mmap 256 MB
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-65536;'
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA mmap_size=268435456;'
+            ),
+        },
     }
 }
 
@@ -108,6 +119,10 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# รายงานน้ำมัน Excel: "xlsxwriter" (เร็ว), "openpyxl_writeonly" หรือ "openpyxl" (แบบเดิม)
+# ถ้าเครื่องไม่มี xlsxwriter จะถอยไปใช้ openpyxl ให้เอง
+FUEL_XLSX_BACKEND = 'xlsxwriter'
+
 
 # ===== สำคัญ: ตั้งค่า login redirect =====
 LOGIN_URL = 'booking:login'